@@ -0,0 +1,108 @@
+"""
+Parallel spend flood against utils.wallet.debit and utils.wallet.transfer.
+
+A scratch user is funded with BALANCE coins. Then `workers` debits of
+AMOUNT each, and as many transfers to a second scratch user, race on
+their own pool connections. The check fails if more spends succeed than the
+balance allows, if the final balance is not the starting balance minus the
+accepted spends, or if coins are created or lost. The scratch users are
+deleted afterwards.
+
+    python -m benchmarks.wallet_concurrency [workers]
+
+Run it from the repository root against a database created from db.ddl
+(a scratch or staging copy; the two users above are created and removed).
+workers defaults to 25, so 50 connections are opened and the server's
+max_connections must allow that. The exit status is 0 when every check
+passes and 1 otherwise, so it can gate a deploy or CI job.
+
+Needs DB_URL (read from .env like the bot does).
+"""
+import asyncio
+import os
+import sys
+
+import asyncpg
+from dotenv import load_dotenv
+
+from utils.wallet import balance, debit, transfer
+
+SPENDER_ID = -434343
+RECEIVER_ID = -434344
+BALANCE = 1_000
+AMOUNT = 30
+
+
+async def create_user(conn, uid, coins):
+    await conn.execute("INSERT INTO user_config (user_id) VALUES ($1) ON CONFLICT DO NOTHING", uid)
+    await conn.execute("""
+        INSERT INTO users (id, coins, energy, energy_max, mood, mood_max)
+        VALUES ($1, $2, 100, 100, 100, 100)
+    """, uid, coins)
+
+
+async def drop_user(conn, uid):
+    await conn.execute("DELETE FROM users WHERE id = $1", uid)
+    await conn.execute("DELETE FROM user_config WHERE user_id = $1", uid)
+
+
+async def spend(pool, start, op):
+    async with pool.acquire() as conn:
+        await start.wait()
+        if op == "debit":
+            return await debit(conn, SPENDER_ID, AMOUNT) is not None
+        return await transfer(conn, SPENDER_ID, RECEIVER_ID, AMOUNT) is not None
+
+
+async def main(workers):
+    load_dotenv()
+    ops = ["debit", "transfer"] * workers
+    pool = await asyncpg.create_pool(os.getenv("DB_URL"), min_size=len(ops), max_size=len(ops))
+    try:
+        async with pool.acquire() as conn:
+            for uid in (SPENDER_ID, RECEIVER_ID):
+                await drop_user(conn, uid)
+            await create_user(conn, SPENDER_ID, BALANCE)
+            await create_user(conn, RECEIVER_ID, 0)
+        try:
+            start = asyncio.Event()
+            tasks = [asyncio.create_task(spend(pool, start, op)) for op in ops]
+            # Let every task check out its connection before releasing them together
+            await asyncio.sleep(0.5)
+            start.set()
+            results = await asyncio.gather(*tasks)
+
+            async with pool.acquire() as conn:
+                spender = await balance(conn, SPENDER_ID)
+                receiver = await balance(conn, RECEIVER_ID)
+        finally:
+            async with pool.acquire() as conn:
+                for uid in (SPENDER_ID, RECEIVER_ID):
+                    await drop_user(conn, uid)
+    finally:
+        await pool.close()
+
+    debits = sum(ok for ok, op in zip(results, ops) if op == "debit")
+    transfers = sum(ok for ok, op in zip(results, ops) if op == "transfer")
+    accepted = (debits + transfers) * AMOUNT
+    print(f"attempted {len(ops)} spends of {AMOUNT} against a balance of {BALANCE}")
+    print(f"accepted  {debits} debits, {transfers} transfers ({accepted} coins)")
+    print(f"final     spender {spender}, receiver {receiver}")
+
+    checks = [
+        (accepted <= BALANCE, "more was spent than the balance held"),
+        (spender == BALANCE - accepted, "spender balance does not match accepted spends"),
+        (spender >= 0, "balance went negative"),
+        (receiver == transfers * AMOUNT, "receiver balance does not match accepted transfers"),
+        (debits + transfers == min(len(ops), BALANCE // AMOUNT), "a spend was refused while funds remained"),
+    ]
+    failed = [message for ok, message in checks if not ok]
+    for message in failed:
+        print(f"FAIL: {message}")
+    if not failed:
+        print("ok")
+    return not failed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 25)) else 1)
@@ -0,0 +1,109 @@
+"""
+Round trips and latency of the work command's database path, before and after.
+
+"legacy" replays the statement sequence the work command used to run on a
+successful shift with drops. "pipelined" is the current path:
+load_work_state followed by apply_work. Both run against a scratch user
+inside a transaction that is rolled back, so the database is left
+untouched.
+
+    python -m benchmarks.work_round_trips [iterations]
+
+Needs DB_URL (read from .env like the bot does).
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+
+from utils.singleton import EffectID, ItemID
+from utils.work import apply_work, load_work_state
+
+BENCH_USER_ID = -424242
+DROPS = {ItemID.SCRAP: 2, ItemID.WOOD: 1, ItemID.STONE: 1, ItemID.HERB: 1, ItemID.COAL: 1}
+
+
+async def legacy_work(conn, uid):
+    await conn.execute("INSERT INTO user_config (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING", uid)
+    if not await conn.fetchrow("SELECT id FROM users WHERE id = $1", uid):
+        await conn.execute("""
+            INSERT INTO users (id, coins, energy, energy_max, mood, mood_max)
+            VALUES ($1, 0, 100, 100, 100, 100)
+        """, uid)
+    await conn.fetchval("SELECT 1 FROM current_effects WHERE user_id = $1 AND effect_id = 10", uid)
+    await conn.fetchrow("SELECT coins, energy, energy_max, mood, mood_max FROM users WHERE id = $1", uid)
+    await conn.fetchval("SELECT quantity FROM inventory WHERE id = $1 AND item_id = 26 AND quantity > 0", uid)
+    await conn.fetchval("SELECT 1 FROM current_effects WHERE user_id = $1 AND effect_id = 8", uid)
+    await conn.fetchval("SELECT 1 FROM current_effects WHERE user_id = $1 AND effect_id = 9", uid)
+    await conn.execute("""
+        UPDATE users
+        SET coins = coins + $1, energy = GREATEST(energy - $2, 0), mood = GREATEST(mood - 1, 0)
+        WHERE id = $3
+    """, 500, 10, uid)
+    for item_id, qty in DROPS.items():
+        await conn.execute("""
+            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, $2, $3)
+            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+        """, uid, item_id, qty)
+    await conn.execute("""
+        INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
+        VALUES ($1, 10, 30, 30, NOW())
+        ON CONFLICT (user_id, effect_id) DO UPDATE SET duration = 30, ticks = 30, applied_at = NOW()
+    """, uid)
+
+
+async def pipelined_work(conn, uid):
+    # ensure_user is cached after the first call and the effect checks are
+    # answered in memory, so neither costs a round trip here
+    await load_work_state(conn, uid)
+    await apply_work(conn, uid, 500, 10, 1, DROPS, {EffectID.OVERWORKED: 30})
+
+
+async def measure(conn, func, iterations):
+    queries = []
+    conn.add_query_logger(queries.append)
+    timings = []
+    counts = []
+    try:
+        for _ in range(iterations):
+            tr = conn.transaction()
+            await tr.start()
+            try:
+                await conn.execute("""
+                    INSERT INTO user_config (user_id) VALUES ($1) ON CONFLICT DO NOTHING;
+                    INSERT INTO users (id, coins, energy, energy_max, mood, mood_max)
+                    VALUES ($1, 0, 100, 100, 100, 100);
+                """.replace("$1", str(BENCH_USER_ID)))
+                await asyncio.sleep(0)
+                queries.clear()
+                started = time.perf_counter()
+                await func(conn, BENCH_USER_ID)
+                timings.append(time.perf_counter() - started)
+                # Query loggers run via call_soon; let them catch up
+                await asyncio.sleep(0)
+                counts.append(len(queries))
+            finally:
+                await tr.rollback()
+    finally:
+        conn.remove_query_logger(queries.append)
+    return max(counts), statistics.median(timings) * 1000
+
+
+async def main(iterations):
+    load_dotenv()
+    conn = await asyncpg.connect(os.getenv("DB_URL"))
+    try:
+        print(f"{'path':<10} {'round trips':>12} {'median ms':>10}")
+        for name, func in (("legacy", legacy_work), ("pipelined", pipelined_work)):
+            trips, median_ms = await measure(conn, func, iterations)
+            print(f"{name:<10} {trips:>12} {median_ms:>10.2f}")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
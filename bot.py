@@ -1,13 +1,23 @@
 import os
 import asyncio
+import importlib
+import time
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 import asyncpg
-import uvicorn
 from datetime import datetime, timezone
 
 from utils.misc import get_system_info
+from utils.guild_config import GuildConfig, DEFAULT_PREFIX
+from utils.database import create_pool
+from utils.command_sync import sync_if_changed
+from utils.cache import TTLCache, purge_all
+from utils import metrics, votes, web
+from utils.scheduler import JobScheduler
+from utils.profiles import ProfileResolver
+from utils.db_helpers import flush_spending
+from utils.ledger import coin_ledger
 from datetime import datetime, timezone
 
 import logging
@@ -25,33 +35,48 @@ intents = discord.Intents.all()
 
 async def get_prefix(bot, message):
     if not message.guild:
-        return "."
-    guild_id = message.guild.id
-    async with bot.db.acquire() as conn:
-        prefix = await conn.fetchval(
-            "SELECT prefix FROM guild_config WHERE guild_id = $1", guild_id
-        )
-    return prefix if prefix else "."
+        return DEFAULT_PREFIX
+    return bot.guild_config.prefix(message.guild.id)
 
 bot = commands.Bot(command_prefix=get_prefix, intents=intents, help_command=None)
 bot.start_time = datetime.now(timezone.utc)
+bot.profiles = ProfileResolver(bot)
 
-work_cache = {}
-gambling_cache = {}
-work_failures_cache = {}
-mining_events_cache = {}
-async def add_guild_to_db(guild_id):
-    """Adds a guild to the database if it doesn't exist."""
-    try:
-        async with bot.db.acquire() as conn:
+# Per-user activity trackers. Entries expire on their own, see utils/cache.py
+work_cache = TTLCache("work", ttl=5 * 60, maxsize=50_000)
+gambling_cache = TTLCache("gambling", ttl=24 * 60 * 60, maxsize=50_000)
+work_failures_cache = TTLCache("work_failures", ttl=24 * 60 * 60, maxsize=50_000)
+async def add_guilds_to_db(guild_ids):
+    """Registers many guilds in one round trip (guild_config and guilds)."""
+    guild_ids = list(guild_ids)
+    if not guild_ids:
+        return
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
             await conn.execute(
                 """
                 INSERT INTO guild_config (guild_id, allow_rob)
-                VALUES ($1, TRUE)
+                SELECT id, TRUE FROM UNNEST($1::bigint[]) AS t(id)
                 ON CONFLICT (guild_id) DO NOTHING;
                 """,
-                guild_id,
+                guild_ids,
             )
+            await conn.execute(
+                """
+                INSERT INTO guilds (id)
+                SELECT id FROM UNNEST($1::bigint[]) AS t(id)
+                ON CONFLICT (id) DO NOTHING;
+                """,
+                guild_ids,
+            )
+    for guild_id in guild_ids:
+        bot.guild_config.add(guild_id)
+
+
+async def add_guild_to_db(guild_id):
+    """Adds a guild to the database if it doesn't exist."""
+    try:
+        await add_guilds_to_db([guild_id])
         logger.info(f"Added guild {guild_id} to database.")
     except Exception as e:
         logger.error(f"Error adding guild {guild_id} to database: {e}")
@@ -67,23 +92,80 @@ async def remove_guild_from_db(guild_id):
                 """,
                 guild_id,
             )
+        bot.guild_config.discard(guild_id)
         logger.info(f"Removed guild {guild_id} from database.")
     except Exception as e:
         logger.error(f"Error removing guild {guild_id} from database: {e}")
 
+async def sync_guild_members(guild):
+    """Replace a guild's rows in guild_members with its current (non-bot) members."""
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM guild_members WHERE guild_id = $1", guild.id)
+            # Read the member list only after the DELETE: a join handled before
+            # this point is in the list, and one handled later inserts its own
+            # row, which the DELETE's snapshot cannot see. ON CONFLICT covers a
+            # join inserted between the two statements.
+            user_ids = [member.id for member in guild.members if not member.bot]
+            await conn.execute("""
+                INSERT INTO guild_members (guild_id, user_id)
+                SELECT $1, user_id FROM UNNEST($2::bigint[]) AS t(user_id)
+                ON CONFLICT DO NOTHING
+            """, guild.id, user_ids)
+    return len(user_ids)
+
+
+async def sync_all_guild_members():
+    """Resync every guild; also run periodically to repair join/leave events missed during reconnects."""
+    started = time.perf_counter()
+    total = 0
+    for guild in bot.guilds:
+        # A partial member list would drop everyone not yet chunked
+        if not guild.chunked:
+            continue
+        try:
+            total += await sync_guild_members(guild)
+        except Exception as e:
+            logger.error(f"Error syncing members of guild {guild.id}: {e}")
+    logger.info(f"Synced {total} guild members in {time.perf_counter() - started:.3f}s")
+
 @bot.event
 async def on_guild_join(guild):
     await add_guild_to_db(guild.id)
+    try:
+        await sync_guild_members(guild)
+    except Exception as e:
+        logger.error(f"Error syncing members of guild {guild.id}: {e}")
+
+@bot.event
+async def on_member_join(member):
+    if member.bot:
+        return
+    try:
+        async with bot.db.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO guild_members (guild_id, user_id) VALUES ($1, $2)
+                ON CONFLICT DO NOTHING
+            """, member.guild.id, member.id)
+    except Exception as e:
+        logger.error(f"Error adding member {member.id} to guild {member.guild.id}: {e}")
+
+@bot.event
+async def on_member_remove(member):
+    try:
+        async with bot.db.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM guild_members WHERE guild_id = $1 AND user_id = $2", member.guild.id, member.id
+            )
+    except Exception as e:
+        logger.error(f"Error removing member {member.id} from guild {member.guild.id}: {e}")
 
 @bot.event
 async def on_guild_remove(guild):
     await remove_guild_from_db(guild.id)
 
 async def set_prefix(guild_id, new_prefix):
-    async with bot.db.acquire() as conn:
-        await conn.execute(
-            "UPDATE guild_config SET prefix = $1 WHERE guild_id = $2", new_prefix, guild_id
-        )
+    await bot.guild_config.set(guild_id, "prefix", new_prefix)
 
 
 
@@ -102,94 +184,128 @@ async def get_total_connections():
         """)
     return total_connections
 
-def cleanup_activity_caches():
-    """Clean up old entries from activity tracking caches"""
-    from datetime import datetime, timedelta
-    
-    now = datetime.now()
-    five_mins_ago = now - timedelta(minutes=5)
-    one_day_ago = now - timedelta(days=1)
-    
-    for user_id in list(work_cache.keys()):
-        work_cache[user_id] = [ts for ts in work_cache[user_id] if ts > five_mins_ago]
-        if not work_cache[user_id]:
-            del work_cache[user_id]
-    
-    for key in list(gambling_cache.keys()):
-        if '_' in key:
-            try:
-                date_str = key.split('_')[1]
-                cache_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                if cache_date < one_day_ago.date():
-                    del gambling_cache[key]
-            except:
-                pass
-    
-    today = now.date()
-    for user_id in list(work_failures_cache.keys()):
-        if 'last_reset' in work_failures_cache[user_id]:
-            last_reset = work_failures_cache[user_id]['last_reset']
-            if last_reset < today:
-                work_failures_cache[user_id] = {'count': 0, 'last_reset': today}
-
 async def create_db_pool():
-    bot.db = await asyncpg.create_pool(dsn=db_url, max_size=2, min_size=1)
+    bot.db = await create_pool(db_url)
+    bot.guild_config = GuildConfig(bot.db)
+    await bot.guild_config.load()
     
     from utils.translation import init_translation
     init_translation(bot)
 
 # Removed update_guild_data
 
-async def load_cogs():
+def _discover_cogs():
     cog_dirs = []
     if os.path.exists("./core/cogs"):
-        cog_dirs.append("./core/cogs")
+        cog_dirs.append(("./core/cogs", "core.cogs"))
     if os.path.exists("./advanced/cogs"):
-        cog_dirs.append("./advanced/cogs")
+        cog_dirs.append(("./advanced/cogs", "advanced.cogs"))
 
-    loaded_cogs = 0
-    failed_cogs = 0
-
-    for cog_dir in cog_dirs:
-        for filename in os.listdir(cog_dir):
+    modules = []
+    for cog_dir, package in cog_dirs:
+        for filename in sorted(os.listdir(cog_dir)):
             if filename.endswith(".py"):
-                if "core" in cog_dir:
-                    module_path = f"core.cogs.{filename[:-3]}"
-                elif "advanced" in cog_dir:
-                    module_path = f"advanced.cogs.{filename[:-3]}"
-                else:
-                    continue
-
-                try:
-                    await bot.load_extension(module_path)
-                    print(f"[+] Loaded cog: {filename}")
-                    loaded_cogs += 1
-                except Exception as e:
-                    print(f"[!] Failed to load cog '{filename}': {e}")
-                    failed_cogs += 1
+                modules.append((filename, f"{package}.{filename[:-3]}"))
+    return modules
+
+
+# Third-party modules that dominate cold start (custom.py, misc.py). They
+# have no dependency on each other, so they are imported concurrently in
+# worker threads before any cog runs and the cog imports find them cached.
+HEAVY_IMPORTS = ("matplotlib", "deep_translator", "pycountry", "rapidfuzz")
+
 
+async def _preimport(name):
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(importlib.import_module, name)
+    except ImportError as e:
+        # The cog that needs it reports the failure when it is imported
+        logger.warning(f"Pre-import of {name} failed: {e}")
+    return name, time.perf_counter() - started
+
+
+async def load_cogs():
+    modules = _discover_cogs()
+    profile = {}
+    total_started = time.perf_counter()
+
+    preimports = await asyncio.gather(*(_preimport(name) for name in HEAVY_IMPORTS))
+
+    # Cogs themselves are imported and set up one at a time, in file order:
+    # setup() calls add_cog, and cogs such as economy import sibling cog
+    # modules at load time. setup() is called directly because
+    # load_extension would execute the already imported module a second time.
+    for filename, module_path in modules:
+        entry = profile[filename] = {"import": 0.0, "setup": 0.0, "error": None}
+        try:
+            started = time.perf_counter()
+            module = importlib.import_module(module_path)
+            entry["import"] = time.perf_counter() - started
+            started = time.perf_counter()
+            await module.setup(bot)
+            entry["setup"] = time.perf_counter() - started
+            print(f"[+] Loaded cog: {filename}")
+        except Exception as e:
+            entry["error"] = e
+            print(f"[!] Failed to load cog '{filename}': {e}")
+
+    failed_cogs = sum(1 for entry in profile.values() if entry["error"])
+    loaded_cogs = len(profile) - failed_cogs
     print(f"Cogs loaded: {loaded_cogs} loaded, {failed_cogs} failed")
+    print_startup_profile(profile, preimports, time.perf_counter() - total_started)
 
-async def periodic_cache_cleanup():
-    """Run cache cleanup every hour"""
-    while True:
-        await asyncio.sleep(3600)
-        cleanup_activity_caches()
-        logger.info("Cache cleanup completed")
+
+def print_startup_profile(profile, preimports, wall_time):
+    """Print the concurrent pre-imports, then cogs ranked by import + setup time."""
+    lines = [f"Startup profile ({wall_time:.2f}s wall):"]
+    for name, elapsed in sorted(preimports, key=lambda item: item[1], reverse=True):
+        lines.append(f"  {elapsed:7.3f}s  pre-import {name}")
+    ranked = sorted(profile.items(), key=lambda item: item[1]["import"] + item[1]["setup"], reverse=True)
+    for filename, entry in ranked:
+        status = "FAILED" if entry["error"] else ""
+        lines.append(
+            f"  {entry['import'] + entry['setup']:7.3f}s  import {entry['import']:7.3f}s  "
+            f"setup {entry['setup']:7.3f}s  {filename} {status}".rstrip()
+        )
+    report = "\n".join(lines)
+    print(report)
+    logger.info(report)
+
+async def purge_caches():
+    """Purge expired cache entries"""
+    removed = purge_all()
+    logger.info(f"Cache cleanup completed, {removed} expired entries removed")
 
 @bot.event
 async def on_ready():
     try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} app commands.")
-        print(f"Synced {len(synced)} app commands.")
+        synced = await sync_if_changed(bot.tree)
+        if synced is None:
+            print("App commands unchanged, sync skipped.")
+        else:
+            logger.info(f"Synced {len(synced)} app commands.")
+            print(f"Synced {len(synced)} app commands.")
         print("Bot's servers :", len(bot.guilds))
 
-        for guild in bot.guilds:
-            await add_guild_to_db(guild.id)
-        
-        asyncio.create_task(periodic_cache_cleanup())
-        logger.info("Started periodic cache cleanup task")
+        # on_ready fires again after every gateway reconnect; the guild
+        # registration only needs to happen once.
+        if getattr(bot, "startup_done", False):
+            return
+        bot.startup_done = True
+
+        started = time.perf_counter()
+        try:
+            await add_guilds_to_db(guild.id for guild in bot.guilds)
+            logger.info(f"Registered {len(bot.guilds)} guilds in {time.perf_counter() - started:.3f}s")
+        except Exception as e:
+            logger.error(f"Error registering guilds: {e}")
+        # Member lists can be large; load them without holding up on_ready
+        asyncio.create_task(sync_all_guild_members())
+
+        ready_after = (datetime.now(timezone.utc) - bot.start_time).total_seconds()
+        logger.info(f"Startup complete in {ready_after:.2f}s")
+        print(f"Startup complete in {ready_after:.2f}s")
 
     except Exception as e:
         logger.error(f"[ERR] Sync failed: {e}")
@@ -204,11 +320,32 @@ async def main():
     active_connections = await get_total_connections()
     logger.info(f"Total database connections: {active_connections}")
     print(f"Total database connections: {active_connections}")
+    bot.scheduler = JobScheduler()
+    bot.scheduler.every("cache_cleanup", purge_caches, seconds=300)
+    bot.scheduler.every(
+        "spending_flush", lambda: flush_spending(bot.db),
+        seconds=int(os.getenv("SPENDING_FLUSH_SECONDS") or 10),
+    )
+    bot.scheduler.every(
+        "guild_members_sync", sync_all_guild_members,
+        seconds=int(os.getenv("GUILD_MEMBERS_SYNC_SECONDS") or 6 * 60 * 60),
+    )
+    # Before the cogs load, so opening balances are taken before any coin moves
+    await coin_ledger.start(bot.db)
     await load_cogs()
+    bot.scheduler.start()
     logger.info("Cogs loaded.")
     print(" Cogs loaded.")
-   
-    await bot.start(token)
+
+    metrics.install_command_hooks(bot)
+    asyncio.create_task(web.serve(bot))
+
+    try:
+        await bot.start(token)
+    finally:
+        await coin_ledger.close()
+        await flush_spending(bot.db)
+        await votes.close_session()
 
 if __name__ == "__main__":
     get_system_info()
@@ -3,7 +3,6 @@ from discord.ext import commands
 from discord import app_commands
 import logging
 from rapidfuzz import process, fuzz
-from utils.db_helpers import ensure_guild_cfg
 LOCALE_MAP = {
     "af": "Afrikaans - Afrikaans",
     "sq": "Albanian - Shqip",
@@ -144,19 +143,14 @@ class Admin(commands.GroupCog, name="admin"):
 
         percentage = tax_rate * 100
         try:
-            await ensure_guild_cfg(self.bot.db, ctx.guild.id)
-            async with self.bot.db.acquire() as conn:
-                await conn.execute(
-                    "UPDATE guild_config SET transfer_tax_rate = $1 WHERE guild_id = $2",
-                    tax_rate, ctx.guild.id
-                )
+            await self.bot.guild_config.set(ctx.guild.id, "transfer_tax_rate", tax_rate)
 
-                embed = discord.Embed(
-                    title="Transfer Tax Updated",
-                    description=f"Transfer tax rate set to {percentage:.1f}%. Members will pay this tax on commands like `/give-coins`.",
-                    color=discord.Color.green()
-                )
-                await ctx.reply(embed=embed)
+            embed = discord.Embed(
+                title="Transfer Tax Updated",
+                description=f"Transfer tax rate set to {percentage:.1f}%. Members will pay this tax on commands like `/give-coins`.",
+                color=discord.Color.green()
+            )
+            await ctx.reply(embed=embed)
 
         except Exception as e:
             logging.exception(e)
@@ -173,23 +167,15 @@ class Admin(commands.GroupCog, name="admin"):
     @commands.hybrid_command(name="get-transfer-tax", description="Get the current transfer tax rate")
     async def get_transfer_tax(self, ctx: commands.Context):
         try:
-            await ensure_guild_cfg(self.bot.db, ctx.guild.id)
-            async with self.bot.db.acquire() as conn:
-                tax_rate = await conn.fetchval(
-                    "SELECT transfer_tax_rate FROM guild_config WHERE guild_id = $1",
-                    ctx.guild.id
-                )
-
-                if tax_rate is None:
-                    tax_rate = 0.0
+            tax_rate = self.bot.guild_config.transfer_tax_rate(ctx.guild.id)
 
-                percentage = tax_rate * 100
-                embed = discord.Embed(
-                    title="Transfer Tax Rate",
-                    description=f"Current transfer tax rate: {percentage:.1f}%",
-                    color=discord.Color.blue()
-                )
-                await ctx.reply(embed=embed)
+            percentage = tax_rate * 100
+            embed = discord.Embed(
+                title="Transfer Tax Rate",
+                description=f"Current transfer tax rate: {percentage:.1f}%",
+                color=discord.Color.blue()
+            )
+            await ctx.reply(embed=embed)
 
         except Exception as e:
             logging.exception(e)
@@ -213,12 +199,7 @@ class Admin(commands.GroupCog, name="admin"):
             return
 
         try:
-            async with self.bot.db.acquire() as conn:
-                await conn.execute(
-                    "UPDATE guild_config SET prefix = $1 WHERE guild_id = $2",
-                    prefix,
-                    ctx.guild.id
-                )
+            await self.bot.guild_config.set(ctx.guild.id, "prefix", prefix)
 
             embed = discord.Embed(
                 title="Prefix Updated",
@@ -241,26 +222,8 @@ class Admin(commands.GroupCog, name="admin"):
     async def set_rob(self, ctx: commands.Context):
         """Toggles robbing feature for the server."""
         try:
-            async with self.bot.db.acquire() as conn:
-
-                allow = await conn.fetchval("SELECT allow_rob FROM guild_config WHERE guild_id = $1", ctx.guild.id)
-                
-                
-                if allow is None:
-                    print("So allow is none here")
-                    allow = True
-
-
-                new_allow = not allow
-
-
-                await conn.execute(
-                    "UPDATE guild_config SET allow_rob = $1 WHERE guild_id = $2", new_allow, ctx.guild.id
-                )
-
-
-                
-
+            new_allow = not self.bot.guild_config.allow_rob(ctx.guild.id)
+            await self.bot.guild_config.set(ctx.guild.id, "allow_rob", new_allow)
 
             embed = discord.Embed(
                 title="Robbing Feature Updated",
@@ -288,11 +251,7 @@ class Admin(commands.GroupCog, name="admin"):
         if locale not in LOCALE_MAP:
             return await ctx.reply(f"Invalid locale code: `{locale}`")
         
-        async with self.bot.db.acquire() as conn:
-            await conn.execute(
-                "UPDATE guild_config SET locale = $1 WHERE guild_id = $2",
-                locale, ctx.guild.id
-            )
+        await self.bot.guild_config.set(ctx.guild.id, "locale", locale)
         
         lang_name = LOCALE_MAP[locale]
         embed = discord.Embed(
@@ -304,8 +263,7 @@ class Admin(commands.GroupCog, name="admin"):
 
     @commands.hybrid_command(name="get-locale", description="Check server language setting")
     async def get_locale(self, ctx: commands.Context):
-        async with self.bot.db.acquire() as conn:
-            locale = await conn.fetchval("SELECT locale FROM guild_config WHERE guild_id = $1", ctx.guild.id)
+        locale = self.bot.guild_config.locale(ctx.guild.id)
         
         if not locale:
             embed = discord.Embed(
@@ -3,6 +3,7 @@ import discord
 from discord.ext import commands
 from discord.ui import View, Button
 from utils.db_helpers import *
+from utils.wallet import credit, debit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -101,10 +102,7 @@ class BlackjackView(View):
 
         if payout > 0:
             async with self.bot.db.acquire() as conn:
-                await conn.execute(
-                    "UPDATE users SET coins = coins + $1 WHERE id = $2",
-                    payout, user_id
-                )
+                await credit(conn, user_id, payout, reason="blackjack")
 
         await interaction.edit_original_response(
             embed=self.build_embed(result),
@@ -162,15 +160,11 @@ class Blackjack(commands.Cog):
             return await ctx.send(embed=discord.Embed(title="Error: Bet Limit Exceeded", description=f"Maximum bet: {cap} coins\nNote: Upvote bot to increase limit to 500k coins", color=discord.Color.red()))
         async with self.bot.db.acquire() as conn:
             await ensure_user(self.bot.db, ctx.author.id)
-            row = await conn.fetchrow("SELECT coins FROM users WHERE id = $1", ctx.author.id)
-            if not row or row["coins"] < bet:
-                return await ctx.reply(f"Error: Insufficient funds\nRequired: {bet} coins\nAvailable: {row['coins'] if row else 0} coins", ephemeral=True)
+            if await debit(conn, ctx.author.id, bet, reason="blackjack") is None:
+                coins = await conn.fetchval("SELECT coins FROM users WHERE id = $1", ctx.author.id)
+                return await ctx.reply(f"Error: Insufficient funds\nRequired: {bet} coins\nAvailable: {coins or 0} coins", ephemeral=True)
 
             await log_spending(self.bot.db, bet)
-            await conn.execute(
-                "UPDATE users SET coins = coins - $1 WHERE id = $2",
-                bet, ctx.author.id
-            )
 
         deck = create_deck()
         random.shuffle(deck)
@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.db_helpers import ensure_user, ensure_inventory
+from utils.db_helpers import ensure_user, take_item, grant_items
 import math
 from utils.parser import parse_amount, AmountParseError  # Added for flexible amount parsing
 
@@ -116,7 +116,6 @@ class Crafting(commands.Cog):
         
         user_id = ctx.author.id
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
         
         async with self.bot.db.acquire() as conn:
             # 1. Find all recipes that produce this item
@@ -248,17 +247,7 @@ class Crafting(commands.Cog):
             for req in requirements:
                 if req['is_consumed']:
                     needed = req['qty'] * parsed_amount
-                    await conn.execute("""
-                        UPDATE inventory 
-                        SET quantity = quantity - $1
-                        WHERE id = $2 AND item_id = $3
-                    """, needed, user_id, req['item_id'])
-                    
-                    # Remove if quantity reaches 0
-                    await conn.execute("""
-                        DELETE FROM inventory
-                        WHERE id = $1 AND item_id = $2 AND quantity <= 0
-                    """, user_id, req['item_id'])
+                    await take_item(conn, user_id, req['item_id'], needed)
             
             # Give result items (use parsed_amount)
             results = await conn.fetch("""
@@ -267,19 +256,14 @@ class Crafting(commands.Cog):
                 WHERE recipe_id = $1
             """, recipe_id)
             
-            result_text = []
-            for result in results:
-                result_qty = result['quantity'] * parsed_amount
-                
-                # Add to inventory
-                await conn.execute("""
-                    INSERT INTO inventory (id, item_id, quantity)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + $3
-                """, user_id, result['item_id'], result_qty)
-                
-                item_name = await conn.fetchval("SELECT name FROM items WHERE id = $1", result['item_id'])
-                result_text.append(f"{result_qty}x {item_name}")
+            # Add to inventory
+            granted = {result['item_id']: result['quantity'] * parsed_amount for result in results}
+            await grant_items(conn, user_id, granted)
+
+            names = dict(await conn.fetch(
+                "SELECT id, name FROM items WHERE id = ANY($1::int[])", list(granted)
+            ))
+            result_text = [f"{qty}x {names.get(item_id)}" for item_id, qty in granted.items()]
             
             # Success message (use parsed_amount)
             embed = discord.Embed(
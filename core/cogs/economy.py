@@ -7,30 +7,28 @@ from typing import Optional
 
 from utils.db_helpers import *
 from utils.economy import format_number
-from utils.singleton import BASE_TICK
+from utils.singleton import BASE_TICK, EffectID
+from utils.effects import RETURNING_EXPIRY, active_effects, settle_user
+from utils.leaderboard import global_leaderboard
+from utils.work import apply_work, load_work_state
+from utils.wallet import bet, credit, debit, fund_credit, fund_debit, transfer
+from utils.database import db_url
 from .items import get_inventory_total, get_inventory_penalty, get_inventory_warning
 from utils.parser import parse_amount, AmountParseError  # Added for flexible amount parsing
 
-async def calculate_transfer_tax(db, guild_id: int, amount: int):
+def calculate_transfer_tax(guild_config, guild_id: int, amount: int):
     """Calculate transfer tax for a given amount in a guild.
 
     Returns:
         tuple: (tax_amount, remaining_amount)
     """
     try:
-        async with db.acquire() as conn:
-            tax_rate = await conn.fetchval(
-                "SELECT transfer_tax_rate FROM guild_config WHERE guild_id = $1",
-                guild_id
-            )
-
-            if tax_rate is None:
-                tax_rate = 0.0
+        tax_rate = guild_config.transfer_tax_rate(guild_id)
 
-            tax_amount = int(amount * tax_rate)
-            remaining_amount = amount - tax_amount
+        tax_amount = int(amount * tax_rate)
+        remaining_amount = amount - tax_amount
 
-            return tax_amount, remaining_amount
+        return tax_amount, remaining_amount
     except Exception:
         # If there's any error, assume no tax
         return 0, amount
@@ -114,26 +112,21 @@ class ScratchView(discord.ui.View):
         winnings = self.bet * total_multi if total_multi > 0 else 0
 
         async with self.pool.acquire() as conn:
-            is_addict = await conn.fetchval("""
-                SELECT 1 FROM current_effects 
-                WHERE user_id = $1 AND effect_id = 7
-            """, self.user_id)
+            is_addict = active_effects.has(self.user_id, EffectID.GAMBLING_ADDICT)
             
             mood_change = 4 if is_addict else 2
-            
+
             if winnings > 0:
+                # The payout raises mood and GAMBLING_ADDICT may be removed below
+                await settle_user(conn, self.user_id)
                 # Pay winnings directly (coins appear)
-                await conn.execute(
-                    "UPDATE users SET coins = coins + $1, mood = LEAST(mood + $2, mood_max) WHERE id = $3",
-                    winnings, mood_change, self.user_id
-                )
-                
-                mood_row = await conn.fetchrow("SELECT mood, mood_max FROM users WHERE id = $1", self.user_id)
+                mood_row = await credit(conn, self.user_id, winnings, mood=mood_change, reason="scratchcard")
                 if is_addict and mood_row and mood_row['mood'] >= mood_row['mood_max']:
                     await conn.execute("""
                         DELETE FROM current_effects 
                         WHERE user_id = $1 AND effect_id = 7
                     """, self.user_id)
+                    active_effects.untrack(self.user_id, EffectID.GAMBLING_ADDICT, conn)
                 
                 desc = (
                     f"Your picks: {picks}\n"
@@ -295,7 +288,7 @@ class PickUpView(discord.ui.View):
         try:
             await ensure_user(self.bot.db, interaction.user.id)
             async with self.bot.db.acquire() as conn:
-                await conn.execute("UPDATE users SET coins = coins + $1 WHERE id = $2", self.amount, interaction.user.id)
+                await credit(conn, interaction.user.id, self.amount, reason="drop_pickup")
             await self.msg.edit(view=self)
             await interaction.followup.send(f"🎉 You picked up **{self.amount}** coins!", ephemeral=True)
         except Exception as e:
@@ -326,6 +319,17 @@ class Econ(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        await global_leaderboard.rebuild(self.bot.db)
+        self.bot.scheduler.every("leaderboard_rebuild", lambda: global_leaderboard.rebuild(self.bot.db), seconds=900)
+        # The opt-in listener is optional; (re)connect it in the background
+        self.bot.scheduler.every("leaderboard_listen", lambda: global_leaderboard.listen(db_url), seconds=60, run_now=True)
+
+    async def cog_unload(self):
+        self.bot.scheduler.unregister("leaderboard_rebuild")
+        self.bot.scheduler.unregister("leaderboard_listen")
+        await global_leaderboard.close()
+
     # ---------------- status / health ----------------
     @commands.hybrid_command(name="health", description="Check your current stats")
     async def health(self, ctx: commands.Context, target: Optional[discord.Member] = None):
@@ -335,9 +339,9 @@ class Econ(commands.Cog):
                 target = ctx.author
 
             await ensure_user(self.bot.db, target.id)
-            await ensure_inventory(self.bot.db, target.id)
 
             async with self.bot.db.acquire() as conn:
+                await settle_user(conn, target.id)
                 row = await conn.fetchrow("SELECT coins, energy, energy_max, mood, mood_max FROM users WHERE id = $1", target.id)
                 effects = await conn.fetch("""
                     SELECT ue.icon, ue.name, ce.duration, ce.ticks, ce.applied_at
@@ -422,46 +426,36 @@ class Econ(commands.Cog):
         mood_penalty = 5
 
         try:
+            is_overworked = active_effects.has(uid, EffectID.OVERWORKED)
+            
+            if is_overworked:
+                embed = discord.Embed(
+                    title="Alert. Overworked",
+                    description="Mandatory rest period active. Duration fifteen minutes. Wait for effect to expire.",
+                    color=discord.Color.red()
+                )
+                return await ctx.send(embed=embed)
+
+            from datetime import datetime, timedelta
+            from bot import work_cache, work_failures_cache
+            
+            now = datetime.now()
+            five_mins_ago = now - timedelta(minutes=5)
+            
+            if uid not in work_cache:
+                work_cache[uid] = []
+            
+            work_cache[uid] = [ts for ts in work_cache[uid] if ts > five_mins_ago]
+            work_cache[uid].append(now)
+            work_count = len(work_cache[uid])
+
+            # Cached after the first call, so normally no round trip
+            await ensure_user(self.bot.db, uid)
+
             async with self.bot.db.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO user_config (user_id) VALUES ($1)
-                    ON CONFLICT (user_id) DO NOTHING
-                """, uid)
-                
-                user_exists = await conn.fetchrow("SELECT id FROM users WHERE id = $1", uid)
-                if not user_exists:
-                    await conn.execute("""
-                        INSERT INTO users (id, coins, energy, energy_max, mood, mood_max)
-                        VALUES ($1, 0, 100, 100, 100, 100)
-                    """, uid)
-                is_overworked = await conn.fetchval("""
-                    SELECT 1 FROM current_effects 
-                    WHERE user_id = $1 AND effect_id = 10
-                """, uid)
-                
-                if is_overworked:
-                    embed = discord.Embed(
-                        title="Alert. Overworked",
-                        description="Mandatory rest period active. Duration fifteen minutes. Wait for effect to expire.",
-                        color=discord.Color.red()
-                    )
-                    return await ctx.send(embed=embed)
-                
-                from datetime import datetime, timedelta
-                from bot import work_cache
-                
-                now = datetime.now()
-                five_mins_ago = now - timedelta(minutes=5)
-                
-                if uid not in work_cache:
-                    work_cache[uid] = []
-                
-                work_cache[uid] = [ts for ts in work_cache[uid] if ts > five_mins_ago]
-                work_cache[uid].append(now)
-                work_count = len(work_cache[uid])
-                
-                # Get user data
-                row = await conn.fetchrow("SELECT coins, energy, energy_max, mood, mood_max FROM users WHERE id = $1", uid)
+                # Round trip 1: vitals and toolbelt
+                await settle_user(conn, uid)
+                row = await load_work_state(conn, uid)
                 if not row:
                     return await ctx.send("User data not found.")
 
@@ -472,57 +466,33 @@ class Econ(commands.Cog):
                         color=discord.Color.red()
                     )
                     return await ctx.send(embed=embed)
-                
+
+                # Everything below is decided in Python and written at the end
+                effects = {}
+                drops = {}
                 if row["energy"] < 10:
-                    await conn.execute("""
-                        INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
-                        VALUES ($1, 6, 60, 60, NOW())
-                        ON CONFLICT (user_id, effect_id) DO UPDATE
-                        SET duration = 60, ticks = 60, applied_at = NOW()
-                    """, uid)
+                    effects[EffectID.EXHAUSTED] = 60
 
                 mood_ratio = row["mood"] / row["mood_max"] if row["mood_max"] else 0
                 fail_chance = 0.1 if mood_ratio >= 0.6 else 0.5 if mood_ratio >= 0.3 else 0.8
                 is_success = random.random() > fail_chance
 
                 if is_success:
-                    from bot import work_failures_cache
                     work_failures_cache[uid] = {'count': 0, 'last_reset': datetime.now().date()}
                     
                     reward = random.randint(*reward_range)
                     
-                    has_toolbelt = await conn.fetchval("""
-                        SELECT quantity FROM inventory 
-                        WHERE id = $1 AND item_id = 26 AND quantity > 0
-                    """, uid)
-                    
                     toolbelt_bonus = False
-                    if has_toolbelt:
+                    if row["toolbelt"]:
                         reward = int(reward * 1.25)
                         toolbelt_bonus = True
                     
-                    is_motivated = await conn.fetchval("""
-                        SELECT 1 FROM current_effects 
-                        WHERE user_id = $1 AND effect_id = 8
-                    """, uid)
-                    
-                    if is_motivated:
+                    if active_effects.has(uid, EffectID.MOTIVATED):
                         reward = int(reward * 1.25)
                     
-                    is_demoralized = await conn.fetchval("""
-                        SELECT 1 FROM current_effects 
-                        WHERE user_id = $1 AND effect_id = 9
-                    """, uid)
-                    
-                    if is_demoralized:
+                    if active_effects.has(uid, EffectID.DEMORALIZED):
                         reward = int(reward * 0.7)
                     
-                    await conn.execute("""
-                        UPDATE users
-                        SET coins = coins + $1, energy = GREATEST(energy - $2, 0), mood = GREATEST(mood - 1, 0)
-                        WHERE id = $3
-                    """, reward, energy_cost, uid)
-                    
                     # Determine material drops
                     materials_found = []
                     
@@ -530,48 +500,42 @@ class Econ(commands.Cog):
 
                     if random.random() < 0.50:
                         scrap_amt = random.randint(1, 3)
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, 3, $2)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + $2
-                        """, uid, scrap_amt)
+                        drops[3] = drops.get(3, 0) + scrap_amt
                         materials_found.append(f"{scrap_amt}x Scrap")
 
                     if random.random() < 0.40:
                         wood_amt = random.randint(1, 3)
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, 19, $2)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + $2
-                        """, uid, wood_amt)
+                        drops[19] = drops.get(19, 0) + wood_amt
                         materials_found.append(f"{wood_amt}x Wood")
                     
                     if random.random() < 0.25:
                         stone_amt = random.randint(1, 2)
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, 18, $2)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + $2
-                        """, uid, stone_amt)
+                        drops[18] = drops.get(18, 0) + stone_amt
                         materials_found.append(f"{stone_amt}x Stone")
                     
                     if random.random() < 0.10:
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, 3, 1)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + 1
-                        """, uid)
+                        drops[3] = drops.get(3, 0) + 1
                         materials_found.append("1x Scrap")
                     
                     if random.random() < 0.05:
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, 10, 1)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + 1
-                        """, uid)
+                        drops[10] = drops.get(10, 0) + 1
                         materials_found.append("1x Herb")
                     
                     if random.random() < 0.03:
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity) VALUES ($1, 15, 1)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + 1
-                        """, uid)
+                        drops[15] = drops.get(15, 0) + 1
                         materials_found.append("1x Coal")
+
+                    overwork_chance = min(work_count / 20, 1.0)
+                    overworked = random.random() < overwork_chance
+                    if overworked:
+                        effects[EffectID.OVERWORKED] = 30
+
+                    # Round trip 2: coins, vitals, drops and effects together
+                    effect_rows = await apply_work(conn, uid, reward, energy_cost, 1, drops, effects)
+                    if effect_rows is None:
+                        return await ctx.send(embed=make_embed("Warning. Energy insufficient", f"Minimum {energy_cost} required. Rest or consume energy items.", discord.Color.red()))
+                    for effect_row in effect_rows:
+                        active_effects.track(effect_row, conn)
                     
                     # Build VIT-style status report
                     embed = discord.Embed(
@@ -590,37 +554,25 @@ class Econ(commands.Cog):
                     
                     embed.add_field(name="Status", value="Operational", inline=False)
                     
-                    overwork_chance = min(work_count / 20, 1.0)
-                    if random.random() < overwork_chance:
-                        await conn.execute("""
-                            INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
-                            VALUES ($1, 10, 30, 30, NOW())
-                        """, uid)
+                    if overworked:
                         embed.add_field(name="Warning", value="Overworked effect applied. Mandatory rest period: 15 minutes", inline=False)
                     
                     await ctx.send(embed=embed)
                 else:
-                    from bot import work_failures_cache
-                    
-                    if uid not in work_failures_cache:
-                        work_failures_cache[uid] = {'count': 0, 'last_reset': datetime.now().date()}
-                    
-                    work_failures_cache[uid]['count'] += 1
-                    failure_count = work_failures_cache[uid]['count']
+                    # Reassign rather than mutate so the entry's TTL restarts
+                    failures = work_failures_cache.get(uid) or {'count': 0}
+                    failure_count = failures['count'] + 1
                     
                     if failure_count >= 3:
-                        await conn.execute("""
-                            INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
-                            VALUES ($1, 9, 120, 120, NOW())
-                            ON CONFLICT (user_id, effect_id) DO UPDATE
-                            SET duration = 120, ticks = 120, applied_at = NOW()
-                        """, uid)
-                        work_failures_cache[uid]['count'] = 0
-                    await conn.execute("""
-                        UPDATE users
-                        SET energy = GREATEST(energy - $1, 0), mood = GREATEST(mood - $2, 0)
-                        WHERE id = $3
-                    """, energy_cost, mood_penalty, uid)
+                        effects[EffectID.DEMORALIZED] = 120
+                    work_failures_cache[uid] = {'count': 0 if failure_count >= 3 else failure_count, 'last_reset': datetime.now().date()}
+
+                    # Round trip 2
+                    effect_rows = await apply_work(conn, uid, 0, energy_cost, mood_penalty, effects=effects)
+                    if effect_rows is None:
+                        return await ctx.send(embed=make_embed("Warning. Energy insufficient", f"Minimum {energy_cost} required. Rest or consume energy items.", discord.Color.red()))
+                    for effect_row in effect_rows:
+                        active_effects.track(effect_row, conn)
                     
                     # Build VIT-style failure report
                     embed = discord.Embed(
@@ -664,24 +616,12 @@ class Econ(commands.Cog):
             return await ctx.send(embed=make_embed("Error. Invalid bet", "Minimum bet one coin.", discord.Color.red()))
 
         await ensure_user(self.bot.db, uid)
-        await ensure_inventory(self.bot.db, uid)
 
         energy_cost = 1
         mood_gain_on_win = 2
         mood_loss_on_fail = 1
 
         try:
-            async with self.bot.db.acquire() as conn:
-                row = await conn.fetchrow("SELECT coins, energy, mood, mood_max FROM users WHERE id = $1", uid)
-                if row["coins"] < pay:
-                    return await ctx.send(embed=make_embed("Error. Insufficient funds", f"Minimum {pay} coins required. Available {row['coins']} coins.", discord.Color.red()))
-                if row["energy"] < energy_cost:
-                    return await ctx.send(embed=make_embed("Warning. Energy insufficient", f"Minimum {energy_cost} required. Current level {row['energy']}. Rest or consume energy items.", discord.Color.red()))
-
-                # Deduct bet from user
-                await log_spending(self.bot.db, pay)
-                await conn.execute("UPDATE users SET coins = coins - $1, energy = GREATEST(energy - $2, 0) WHERE id = $3", pay, energy_cost, uid)
-
             symbols = ["💠", "🍀", "🔔", "⭐", "🍒"]
             result = [random.choice(symbols) for _ in range(3)]
             counts = {s: result.count(s) for s in set(result)}
@@ -690,7 +630,26 @@ class Econ(commands.Cog):
             multiplier = 5.0 if max_count == 3 else 1.5 if max_count == 2 else 0.0
             winnings = round(pay * multiplier)
 
+            is_addict = active_effects.has(uid, EffectID.GAMBLING_ADDICT)
+
+            mood_change_win = mood_gain_on_win * 2 if is_addict else mood_gain_on_win
+            mood_change_loss = mood_loss_on_fail * 2 if is_addict else mood_loss_on_fail
+
             async with self.bot.db.acquire() as conn:
+                # The bet checks energy and GAMBLING_ADDICT may be removed below
+                await settle_user(conn, uid)
+                # Stake, payout, energy and mood in one conditional statement
+                row = await bet(
+                    conn, uid, pay, winnings, energy=energy_cost,
+                    mood=mood_change_win if winnings > 0 else -mood_change_loss, reason="slots",
+                )
+                if row is None:
+                    row = await conn.fetchrow("SELECT coins, energy FROM users WHERE id = $1", uid)
+                    if row["coins"] < pay:
+                        return await ctx.send(embed=make_embed("Error. Insufficient funds", f"Minimum {pay} coins required. Available {row['coins']} coins.", discord.Color.red()))
+                    return await ctx.send(embed=make_embed("Warning. Energy insufficient", f"Minimum {energy_cost} required. Current level {row['energy']}. Rest or consume energy items.", discord.Color.red()))
+                await log_spending(self.bot.db, pay)
+
                 from bot import gambling_cache
                 from datetime import datetime
                 
@@ -703,34 +662,21 @@ class Econ(commands.Cog):
                 
                 gamble_count = gambling_cache[cache_key]
                 
-                is_addict = await conn.fetchval("""
-                    SELECT 1 FROM current_effects 
-                    WHERE user_id = $1 AND effect_id = 7
-                """, uid)
-                
-                mood_change_win = mood_gain_on_win * 2 if is_addict else mood_gain_on_win
-                mood_change_loss = mood_loss_on_fail * 2 if is_addict else mood_loss_on_fail
-                
-                if winnings > 0:
-                    # Pay winnings directly (coins appear)
-                    await conn.execute("UPDATE users SET coins = coins + $1, mood = LEAST(mood + $2, mood_max) WHERE id = $3", winnings, mood_change_win, uid)
-                    
-                    mood_row = await conn.fetchrow("SELECT mood, mood_max FROM users WHERE id = $1", uid)
-                    if is_addict and mood_row and mood_row['mood'] >= mood_row['mood_max']:
-                        await conn.execute("""
-                            DELETE FROM current_effects 
-                            WHERE user_id = $1 AND effect_id = 7
-                        """, uid)
-                else:
-                    await conn.execute("UPDATE users SET mood = GREATEST(mood - $1, 0) WHERE id = $2", mood_change_loss, uid)
+                if winnings > 0 and is_addict and row['mood'] >= row['mood_max']:
+                    await conn.execute("""
+                        DELETE FROM current_effects 
+                        WHERE user_id = $1 AND effect_id = 7
+                    """, uid)
+                    active_effects.untrack(uid, EffectID.GAMBLING_ADDICT, conn)
                 
                 if not is_addict:
                     addict_chance = min(gamble_count / 40, 1.0)
                     if random.random() < addict_chance:
-                        await conn.execute("""
+                        active_effects.track(await conn.fetchrow(f"""
                             INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
                             VALUES ($1, 7, 999999, 999999, NOW())
-                        """, uid)
+                            {RETURNING_EXPIRY}
+                        """, uid), conn)
 
             color = discord.Color.blue() if winnings > 0 else discord.Color.red()
             status = "Success" if winnings > 0 else "Loss"
@@ -799,7 +745,7 @@ class Econ(commands.Cog):
                     return await ctx.send(embed=make_embed("Insufficient funds", "You don't have enough coins.", discord.Color.red()))
 
             # Calculate transfer tax
-            tax_amount, remaining_amount = await calculate_transfer_tax(self.bot.db, ctx.guild.id, parsed_amount)
+            tax_amount, remaining_amount = calculate_transfer_tax(self.bot.guild_config, ctx.guild.id, parsed_amount)
 
             view = ConfirmGiveView(giver_id, target_id, parsed_amount, self)
             embed = make_embed(
@@ -825,24 +771,11 @@ class Econ(commands.Cog):
                 return await interaction.followup.send(embed=make_embed("Error", "Cannot determine server for tax calculation.", discord.Color.red()), ephemeral=True)
 
             # Calculate transfer tax
-            tax_amount, remaining_amount = await calculate_transfer_tax(self.bot.db, guild_id, amount)
+            tax_amount, remaining_amount = calculate_transfer_tax(self.bot.guild_config, guild_id, amount)
 
             async with self.bot.db.acquire() as conn:
-                async with conn.transaction():
-                    giver = await conn.fetchrow("SELECT coins FROM users WHERE id = $1 FOR UPDATE", giver_id)
-                    if not giver or giver["coins"] < amount:
-                        return await interaction.followup.send(embed=make_embed("Failed", "Insufficient funds.", discord.Color.red()), ephemeral=True)
-
-                
-                    await conn.execute("INSERT INTO guilds (id) VALUES ($1) ON CONFLICT (id) DO NOTHING", guild_id)
-
-                   
-                    await conn.execute("UPDATE users SET coins = coins - $1 WHERE id = $2", amount, giver_id)
-                  
-                    await conn.execute("UPDATE users SET coins = coins + $1 WHERE id = $2", remaining_amount, target_id)
-                 
-                    if tax_amount > 0:
-                        await conn.execute("UPDATE guilds SET coins = coins + $1 WHERE id = $2", tax_amount, guild_id)
+                if await transfer(conn, giver_id, target_id, amount, tax_amount, guild_id, reason="give") is None:
+                    return await interaction.followup.send(embed=make_embed("Failed", "Insufficient funds.", discord.Color.red()), ephemeral=True)
 
            
             if tax_amount > 0:
@@ -880,51 +813,35 @@ class Econ(commands.Cog):
                 async with self.bot.db.acquire() as conn:
                     # Get top 10
                     top = await conn.fetch("""
-                        SELECT id, coins FROM users
-                        WHERE id = ANY($1::bigint[])
-                        ORDER BY coins DESC LIMIT 10
-                    """, [m.id for m in ctx.guild.members if not m.bot])
-                    
-                    # Get total count and author's rank
-                    total_count = await conn.fetchval("""
-                        SELECT COUNT(*) FROM users
-                        WHERE id = ANY($1::bigint[])
-                    """, [m.id for m in ctx.guild.members if not m.bot])
+                        SELECT u.id, u.coins FROM guild_members gm
+                        JOIN users u ON u.id = gm.user_id
+                        WHERE gm.guild_id = $1
+                        ORDER BY u.coins DESC LIMIT 10
+                    """, ctx.guild.id)
                     
-                    author_rank = await conn.fetchval("""
-                        SELECT COUNT(*) + 1 FROM users
-                        WHERE id = ANY($1::bigint[]) AND coins > (
-                            SELECT coins FROM users WHERE id = $2
-                        )
-                    """, [m.id for m in ctx.guild.members if not m.bot], author_id)
-                    
-                    author_coins = await conn.fetchval("SELECT coins FROM users WHERE id = $1", author_id)
+                    # Get total count, author's rank and coins
+                    stats = await conn.fetchrow("""
+                        WITH me AS (SELECT coins FROM users WHERE id = $2 LIMIT 1)
+                        SELECT COUNT(*) AS total_count,
+                               COUNT(*) FILTER (WHERE u.coins > (SELECT coins FROM me)) + 1 AS author_rank,
+                               (SELECT coins FROM me) AS author_coins
+                        FROM guild_members gm
+                        JOIN users u ON u.id = gm.user_id
+                        WHERE gm.guild_id = $1
+                    """, ctx.guild.id, author_id)
+                    total_count = stats["total_count"]
+                    author_rank = stats["author_rank"]
+                    author_coins = stats["author_coins"]
             else:
-                async with self.bot.db.acquire() as conn:
-                    # Get top 10
-                    top = await conn.fetch("""SELECT u.id, u.coins
-                        FROM users u
-                        JOIN user_config c ON u.id = c.user_id
-                        WHERE c.lb_opt_in = TRUE
-                        ORDER BY u.coins DESC
-                        LIMIT 10""")
-                    
-                    # Get total count and author's rank
-                    total_count = await conn.fetchval("""
-                        SELECT COUNT(*) FROM users u
-                        JOIN user_config c ON u.id = c.user_id
-                        WHERE c.lb_opt_in = TRUE
-                    """)
-                    
-                    author_rank = await conn.fetchval("""
-                        SELECT COUNT(*) + 1 FROM users u
-                        JOIN user_config c ON u.id = c.user_id
-                        WHERE c.lb_opt_in = TRUE AND u.coins > (
-                            SELECT coins FROM users WHERE id = $1
-                        )
-                    """, author_id)
-                    
-                    author_coins = await conn.fetchval("SELECT coins FROM users WHERE id = $1", author_id)
+                # Served from the in-memory index; only authors outside it
+                # (opted out or not yet loaded) need their balance fetched
+                top = [{"id": uid, "coins": coins} for uid, coins in global_leaderboard.top(10)]
+                total_count = len(global_leaderboard)
+                author_coins = global_leaderboard.coins(author_id)
+                if author_coins is None:
+                    async with self.bot.db.acquire() as conn:
+                        author_coins = await conn.fetchval("SELECT coins FROM users WHERE id = $1", author_id)
+                author_rank = global_leaderboard.rank(author_coins) if author_coins is not None else None
 
             if not top:
                 embed = make_embed("No data", "No leaderboard data available.", discord.Color.red())
@@ -941,34 +858,23 @@ class Econ(commands.Cog):
                         inline=True
                     )
 
+                profiles = await self.bot.profiles.fetch_many(row["id"] for row in top)
                 for i, row in enumerate(top, start=1):
                     uid = row["id"]
                     coins = row["coins"]
                     
                     # Get user info
-                    if mode == "server" and ctx.guild:
-                        member = ctx.guild.get_member(uid)
-                        if member:
-                            name = member.display_name
-                            username = member.name
-                        else:
-                            # Try to fetch user from bot cache or API
-                            try:
-                                user = await self.bot.fetch_user(uid)
-                                name = user.display_name or user.name
-                                username = user.name
-                            except:
-                                name = f"User {uid}"
-                                username = "Unknown"
+                    member = ctx.guild.get_member(uid) if mode == "server" and ctx.guild else None
+                    user = profiles.get(uid)
+                    if member:
+                        name = member.display_name
+                        username = member.name
+                    elif user:
+                        name = user.display_name or user.name
+                        username = user.name
                     else:
-                        # Global leaderboard - fetch user info
-                        try:
-                            user = await self.bot.fetch_user(uid)
-                            name = user.display_name or user.name
-                            username = user.name
-                        except:
-                            name = f"User {uid}"
-                            username = "Unknown"
+                        name = f"User {uid}"
+                        username = "Unknown"
                     
                     # Create ranking info
                     rank_emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"**#{i}**"
@@ -1022,6 +928,7 @@ class Econ(commands.Cog):
         
         try:
             async with self.bot.db.acquire() as conn:
+                await settle_user(conn, uid)
                 user = await conn.fetchrow("SELECT coins, energy FROM users WHERE id = $1", uid)
                 if not user:
                     return await ctx.send(embed=make_embed("Error: User Not Found", "User record not detected in database.", discord.Color.red()))
@@ -1044,8 +951,22 @@ class Econ(commands.Cog):
                 if user["energy"] < 1:
                     return await ctx.send(embed=make_embed("Warning. Energy insufficient", f"Minimum one required. Current level {user['energy']}. Rest or consume energy items.", discord.Color.red()))
 
-                # Deduct energy and log spending (use parsed_amount)
-                await conn.execute("UPDATE users SET energy = energy - 1 WHERE id = $1", uid)
+                is_addict = active_effects.has(uid, EffectID.GAMBLING_ADDICT)
+                
+                mood_change = 4 if is_addict else 2
+                
+                result = random.choice(["heads", "tails"])
+                win = (guess == result)
+
+                # Stake, payout, energy and mood in one conditional statement,
+                # so a parallel spend between the read above and here cannot
+                # take the balance negative
+                row = await bet(
+                    conn, uid, parsed_amount, parsed_amount * 2 if win else 0,
+                    energy=1, mood=mood_change if win else -mood_change, reason="flipbet",
+                )
+                if row is None:
+                    return await ctx.send(embed=make_embed("Error. Insufficient funds", f"Minimum {parsed_amount} coins required.", discord.Color.red()))
                 await log_spending(self.bot.db, parsed_amount)
                 
                 from bot import gambling_cache
@@ -1060,41 +981,29 @@ class Econ(commands.Cog):
                 
                 gamble_count = gambling_cache[cache_key]
                 
-                is_addict = await conn.fetchval("""
-                    SELECT 1 FROM current_effects 
-                    WHERE user_id = $1 AND effect_id = 7
-                """, uid)
-                
-                mood_change = 4 if is_addict else 2
-                
-                result = random.choice(["heads", "tails"])
-                win = (guess == result)
                 if win:
-                    # Pay winnings directly (coins appear) - use parsed_amount
-                    await conn.execute("UPDATE users SET coins = coins + $1, mood = LEAST(mood + $2, mood_max) WHERE id = $3", parsed_amount, mood_change, uid)
                     desc = f"Result: **{result}**\nStatus: Victory\nPayout: +{parsed_amount} coins"
                     
-                    mood_row = await conn.fetchrow("SELECT mood, mood_max FROM users WHERE id = $1", uid)
-                    if is_addict and mood_row and mood_row['mood'] >= mood_row['mood_max']:
+                    if is_addict and row['mood'] >= row['mood_max']:
                         await conn.execute("""
                             DELETE FROM current_effects 
                             WHERE user_id = $1 AND effect_id = 7
                         """, uid)
+                        active_effects.untrack(uid, EffectID.GAMBLING_ADDICT, conn)
                     
                     color = discord.Color.blue()
                 else:
-                    # Deduct bet (coins disappear) - use parsed_amount
-                    await conn.execute("UPDATE users SET coins = coins - $1, mood = GREATEST(mood - $2, 0) WHERE id = $3", parsed_amount, mood_change, uid)
                     desc = f"Result: **{result}**\nStatus: Loss\nAmount: -{parsed_amount} coins"
                     color = discord.Color.red()
                 
                 if not is_addict:
                     addict_chance = min(gamble_count / 40, 1.0)
                     if random.random() < addict_chance:
-                        await conn.execute("""
+                        active_effects.track(await conn.fetchrow(f"""
                             INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
                             VALUES ($1, 7, 999999, 999999, NOW())
-                        """, uid)
+                            {RETURNING_EXPIRY}
+                        """, uid), conn)
 
             await ctx.send(embed=make_embed("Coinflip Results", desc, color))
         except Exception:
@@ -1121,10 +1030,8 @@ class Econ(commands.Cog):
                 if parsed_amount <= 0:
                     return await ctx.send(embed=make_embed("Invalid amount", "Amount must be greater than 0.", discord.Color.red()))
                 
-                if bal < parsed_amount:
+                if bal < parsed_amount or await debit(conn, uid, parsed_amount, reason="drop") is None:
                     return await ctx.send(embed=make_embed("Insufficient", "You don't have enough coins.", discord.Color.red()))
-                
-                await conn.execute("UPDATE users SET coins = coins - $1 WHERE id = $2", parsed_amount, uid)
 
             embed = make_embed("💰 Coin Drop!", f"{ctx.author.mention} dropped **{parsed_amount}** coins! Click the button to pick them up.", discord.Color.gold())
             embed.set_footer(text="Coins disappear in 30 seconds.")
@@ -1149,7 +1056,6 @@ class Econ(commands.Cog):
             ))
 
         await ensure_user(self.bot.db, uid)
-        await ensure_inventory(self.bot.db, uid)
 
         # Show multipliers & weights
         prize_lines = [f"{m:+}x ({round(w * 100, 2)}%)" for m, w in zip(MULTIPLIERS, MULTI_WEIGHTS)]
@@ -1166,21 +1072,17 @@ class Econ(commands.Cog):
 
         try:
             async with self.bot.db.acquire() as conn:
-                row = await conn.fetchrow("SELECT coins, energy FROM users WHERE id = $1", uid)
-                if row["coins"] < bet:
-                    return await ctx.send(embed=make_embed(
-                        "Error: Insufficient Funds", f"Required: {bet} coins\nAvailable: {row['coins']} coins", discord.Color.red()
-                    ))
-                if row["energy"] < 1:
+                await settle_user(conn, uid)
+                # Deduct bet from user; only read the balance back to explain a refusal
+                if await debit(conn, uid, bet, energy=1, reason="scratchcard") is None:
+                    row = await conn.fetchrow("SELECT coins, energy FROM users WHERE id = $1", uid)
+                    if row["coins"] < bet:
+                        return await ctx.send(embed=make_embed(
+                            "Error: Insufficient Funds", f"Required: {bet} coins\nAvailable: {row['coins']} coins", discord.Color.red()
+                        ))
                     return await ctx.send(embed=make_embed(
                         "Warning. Energy insufficient", f"Minimum one required. Current level {row['energy']}. Rest or consume energy items.", discord.Color.red()
                     ))
-
-                # Deduct bet from user
-                await conn.execute(
-                    "UPDATE users SET coins = coins - $1, energy = GREATEST(energy - 1, 0) WHERE id = $2",
-                    bet, uid
-                )
                 await log_spending(self.bot.db, bet)
                 
                 from bot import gambling_cache
@@ -1195,18 +1097,16 @@ class Econ(commands.Cog):
                 
                 gamble_count = gambling_cache[cache_key]
                 
-                is_addict = await conn.fetchval("""
-                    SELECT 1 FROM current_effects 
-                    WHERE user_id = $1 AND effect_id = 7
-                """, uid)
+                is_addict = active_effects.has(uid, EffectID.GAMBLING_ADDICT)
                 
                 if not is_addict:
                     addict_chance = min(gamble_count / 40, 1.0)
                     if random.random() < addict_chance:
-                        await conn.execute("""
+                        active_effects.track(await conn.fetchrow(f"""
                             INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
                             VALUES ($1, 7, 999999, 999999, NOW())
-                        """, uid)
+                            {RETURNING_EXPIRY}
+                        """, uid), conn)
 
             grid = generate_grid()
             view = ScratchView(uid, grid, bet, self.bot.db, self)
@@ -1254,25 +1154,21 @@ class Econ(commands.Cog):
 
         try:
             async with self.bot.db.acquire() as conn:
-                async with conn.transaction():
-                    guild_row = await conn.fetchrow("SELECT coins FROM guilds WHERE id = $1 FOR UPDATE", ctx.guild.id)
-                    if not guild_row:
-                        return await ctx.send(embed=make_embed("Error", "Guild data not found.", discord.Color.red()))
-                    
-                    # Parse amount using parser utility (supports 'all', '50%', '!100', etc.)
-                    try:
-                        parsed_amount = parse_amount(amount, guild_row["coins"])
-                    except AmountParseError as e:
-                        return await ctx.send(embed=make_embed("Invalid amount", str(e), discord.Color.red()))
-                    
-                    if parsed_amount <= 0:
-                        return await ctx.send(embed=make_embed("Invalid amount", "Amount must be greater than 0.", discord.Color.red()))
-                    
-                    if guild_row["coins"] < parsed_amount:
-                        return await ctx.send(embed=make_embed("Insufficient fund", "Server fund does not have enough coins.", discord.Color.red()))
-
-                    await conn.execute("UPDATE guilds SET coins = coins - $1 WHERE id = $2", parsed_amount, ctx.guild.id)
-                    await conn.execute("UPDATE users SET coins = coins + $1 WHERE id = $2", parsed_amount, target.id)
+                guild_row = await conn.fetchrow("SELECT coins FROM guilds WHERE id = $1", ctx.guild.id)
+                if not guild_row:
+                    return await ctx.send(embed=make_embed("Error", "Guild data not found.", discord.Color.red()))
+                
+                # Parse amount using parser utility (supports 'all', '50%', '!100', etc.)
+                try:
+                    parsed_amount = parse_amount(amount, guild_row["coins"])
+                except AmountParseError as e:
+                    return await ctx.send(embed=make_embed("Invalid amount", str(e), discord.Color.red()))
+                
+                if parsed_amount <= 0:
+                    return await ctx.send(embed=make_embed("Invalid amount", "Amount must be greater than 0.", discord.Color.red()))
+                
+                if guild_row["coins"] < parsed_amount or await fund_debit(conn, ctx.guild.id, target.id, parsed_amount, reason="fund_give") is None:
+                    return await ctx.send(embed=make_embed("Insufficient fund", "Server fund does not have enough coins.", discord.Color.red()))
 
             await ctx.send(embed=make_embed("Fund Transfer Complete", f"Transferred **{format_number(parsed_amount)}** coins to {target.mention}", discord.Color.green()))
         except Exception:
@@ -1289,27 +1185,23 @@ class Econ(commands.Cog):
 
         try:
             async with self.bot.db.acquire() as conn:
-                async with conn.transaction():
-                    # Correct table and ID used here
-                    user_row = await conn.fetchrow("SELECT coins FROM users WHERE id = $1 FOR UPDATE", target.id)
-                    
-                    if not user_row:
-                        return await ctx.send(embed=make_embed("Error", "User data not found.", discord.Color.red()))
-                    
-                    # Parse amount using parser utility (supports 'all', '50%', '!100', etc.)
-                    try:
-                        parsed_amount = parse_amount(amount, user_row["coins"])
-                    except AmountParseError as e:
-                        return await ctx.send(embed=make_embed("Invalid amount", str(e), discord.Color.red()))
-                    
-                    if parsed_amount <= 0:
-                        return await ctx.send(embed=make_embed("Invalid amount", "Amount must be greater than 0.", discord.Color.red()))
-                    
-                    if user_row["coins"] < parsed_amount:
-                        return await ctx.send(embed=make_embed("Insufficient fund", "You do not have enough coins.", discord.Color.red()))
-
-                    await conn.execute("UPDATE guilds SET coins = coins + $1 WHERE id = $2", parsed_amount, ctx.guild.id)
-                    await conn.execute("UPDATE users SET coins = coins - $1 WHERE id = $2", parsed_amount, target.id)
+                # Correct table and ID used here
+                user_row = await conn.fetchrow("SELECT coins FROM users WHERE id = $1", target.id)
+                
+                if not user_row:
+                    return await ctx.send(embed=make_embed("Error", "User data not found.", discord.Color.red()))
+                
+                # Parse amount using parser utility (supports 'all', '50%', '!100', etc.)
+                try:
+                    parsed_amount = parse_amount(amount, user_row["coins"])
+                except AmountParseError as e:
+                    return await ctx.send(embed=make_embed("Invalid amount", str(e), discord.Color.red()))
+                
+                if parsed_amount <= 0:
+                    return await ctx.send(embed=make_embed("Invalid amount", "Amount must be greater than 0.", discord.Color.red()))
+                
+                if user_row["coins"] < parsed_amount or await fund_credit(conn, ctx.guild.id, target.id, parsed_amount, reason="fund_donate") is None:
+                    return await ctx.send(embed=make_embed("Insufficient fund", "You do not have enough coins.", discord.Color.red()))
 
             await ctx.send(embed=make_embed("Fund Donation Complete", f"Donated **{format_number(parsed_amount)}** coins to {ctx.guild.name}", discord.Color.green()))
         except Exception:
@@ -1,81 +1,75 @@
-from discord.ext import commands, tasks
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+import logging
+import time
+
+from discord.ext import commands
 from utils.db_helpers import *
-from datetime import datetime
-from utils.singleton import BASE_TICK, EffectID
+from utils.singleton import BASE_TICK
+from utils.effects import (
+    LAZY_EFFECTS, NOW_EPOCH, TICK_EFFECTS, active_effect, active_effects, adopt_mode, settle_effects, stamp_new_effects,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _tick_statement(column: str, step: int) -> str:
+    if step > 0:
+        value = f"LEAST(u.{column} + {step}, u.{column}_max)"
+    else:
+        value = f"GREATEST(u.{column} - {-step}, 0)"
+    return f"""
+        UPDATE users u SET {column} = {value}
+        FROM current_effects e
+        WHERE e.user_id = u.id AND e.effect_id = $2 AND {active_effect("$3")}
+    """
+
 
 class EffectScheduler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.scheduler = AsyncIOScheduler()
-
-        self.scheduler.add_job(
-            self.reset_shop_at_midnight,
-            name="Effect scheduler"
-        )
-        self.scheduler.start()
 
-        self.check_and_apply_effects.start()
+    async def cog_load(self):
+        async with self.bot.db.acquire() as conn:
+            async with conn.transaction():
+                await adopt_mode(conn)
+        # Registered only now, so no tick runs before the rows are handed over
+        self.bot.scheduler.every("effect_tick", self.check_and_apply_effects, seconds=BASE_TICK, run_now=True)
+        await active_effects.load(self.bot.db)
+        # Safety net for index updates that were rolled back or missed
+        self.bot.scheduler.every("effect_index_reload", lambda: active_effects.load(self.bot.db), seconds=600)
 
     def cog_unload(self):
-        self.check_and_apply_effects.cancel()
+        self.bot.scheduler.unregister("effect_tick")
+        self.bot.scheduler.unregister("effect_index_reload")
 
-    @tasks.loop(seconds=BASE_TICK)
     async def check_and_apply_effects(self):
+        """Expire finished effects, then apply one tick of each stat effect as a single UPDATE"""
+        started = time.perf_counter()
+        touched = {}
         async with self.bot.db.acquire() as conn:
-            await conn.fetch("""
-    DELETE
-    FROM current_effects
-    WHERE EXTRACT(EPOCH FROM applied_at) + (duration * $1) <= EXTRACT(EPOCH FROM clock_timestamp())
-""", BASE_TICK)
-            effect_rows = await conn.fetch("""
-    SELECT user_id, effect_id, applied_at, duration
-    FROM current_effects
-    WHERE EXTRACT(EPOCH FROM applied_at) + (duration * $1) > EXTRACT(EPOCH FROM clock_timestamp())
-""", BASE_TICK)
-
-
-            for effect in effect_rows:
-                user_id = effect['user_id']
-                effect_id = effect['effect_id']
-                applied_at = effect['applied_at'].timestamp()
-                duration = effect['duration'] * BASE_TICK
-
-                end_time = applied_at + duration
-                current_timestamp = datetime.now().timestamp()
-
-                if end_time < datetime.now().timestamp():
-                    
-                    await conn.execute("""
-                        DELETE FROM current_effects
-                        WHERE user_id = $1 AND effect_id = $2
-                    """, user_id, effect_id)
-                    print(f"Effect {effect_id} for user {user_id} has expired and was removed.")
-                else:
-                    await ensure_user(self.bot.db, user_id)
-                    if effect_id == EffectID.REST:
-                        data = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-                        add = min(data['energy']+1, data['energy_max'])
-                        await conn.execute("UPDATE users SET energy = $1 WHERE id = $2", add, user_id)
-                    
-                    elif effect_id == EffectID.REPLENISHED:
-                        data = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-                        add = min(data['energy']+2, data['energy_max'])
-                        await conn.execute("UPDATE users SET energy = $1 WHERE id = $2", add, user_id)
-                    
-                    elif effect_id == EffectID.EXHAUSTED:
-                        data = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-                        drain = max(data['energy']-1, 0)
-                        await conn.execute("UPDATE users SET energy = $1 WHERE id = $2", drain, user_id)
-                    
-                    elif effect_id == EffectID.GAMBLING_ADDICT:
-                        data = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-                        drain = max(data['mood']-1, 0)
-                        await conn.execute("UPDATE users SET mood = $1 WHERE id = $2", drain, user_id)
-
-    async def reset_shop_at_midnight(self):
-        print("Shop reset triggered!")
+            async with conn.transaction():
+                # One instant for every statement below, so an effect cannot
+                # expire between being settled and being deleted
+                now = await conn.fetchval(f"SELECT {NOW_EPOCH}::float8")
+                if LAZY_EFFECTS:
+                    await stamp_new_effects(conn)
+                    # Stats are settled when read; only effects that ran out
+                    # still owe their last ticks before they are removed
+                    touched["settled"] = await settle_effects(conn, expired_only=True, now=now)
+                expired = await conn.execute(
+                    f"DELETE FROM current_effects e WHERE NOT ({active_effect('$2')})", BASE_TICK, now
+                )
+                if not LAZY_EFFECTS:
+                    for effect_id, (column, step) in TICK_EFFECTS.items():
+                        status = await conn.execute(_tick_statement(column, step), BASE_TICK, effect_id, now)
+                        touched[effect_id] = int(status.split()[-1])
+        expired_count = int(expired.split()[-1])
+        # Runs every BASE_TICK seconds; only worth INFO when effects ran out
+        logger.log(
+            logging.INFO if expired_count else logging.DEBUG,
+            "Effect tick: %s expired, %s users updated %s in %.1fms",
+            expired_count, sum(touched.values()), touched, (time.perf_counter() - started) * 1000,
+        )
+        return touched
 
 async def setup(bot):
     await bot.add_cog(EffectScheduler(bot))
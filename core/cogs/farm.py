@@ -3,7 +3,7 @@ from discord.ext import commands
 import datetime
 import random
 
-from utils.db_helpers import is_item_req_valid, ensure_inventory, add_item, check_has_user_upvoted
+from utils.db_helpers import is_item_req_valid, add_item, grant_items, check_has_user_upvoted
 from utils.singleton import BASE_TICK
 
 MAX_FARM_SLOTS = 5
@@ -97,7 +97,6 @@ class Farm(commands.Cog):
     async def info(self, ctx):
         
         async with self.bot.db.acquire() as conn:
-            await ensure_inventory(self.bot.db, ctx.author.id)
             current_farms = await conn.fetchval("SELECT COUNT(*) FROM farm_sessions WHERE user_id = $1", ctx.author.id)
             is_user_upvoted = await check_has_user_upvoted(ctx.author.id)
             max_slots = 10 if is_user_upvoted else MAX_FARM_SLOTS
@@ -134,25 +133,37 @@ class Farm(commands.Cog):
         if not finished:
             return []
 
+        rewards_by_farm = {}
+        for reward in await conn.fetch(
+            "SELECT * FROM farm_info WHERE farm_id = ANY($1::bigint[])",
+            list({farm["farm_id"] for farm in finished}),
+        ):
+            rewards_by_farm.setdefault(reward["farm_id"], []).append(reward)
+
         totals = {}
-        labels = {}
         for farm in finished:
-            farm_rewards = await conn.fetch("SELECT * FROM farm_info WHERE farm_id = $1", farm["farm_id"])
-            for reward in farm_rewards:
+            for reward in rewards_by_farm.get(farm["farm_id"], []):
                 amount = random.randint(max(1, reward["output_amount"] // 2), reward["output_amount"])
-                await add_item(self.bot.db, user_id, reward["output_id"], amount)
-                item = await conn.fetchrow("SELECT * FROM items WHERE id = $1", reward["output_id"])
                 oid = reward["output_id"]
                 totals[oid] = totals.get(oid, 0) + amount
-                labels[oid] = f"{item.get('icon', '')} {item['name']}"
-            await conn.execute("DELETE FROM farm_sessions WHERE session_id = $1", farm["session_id"])
+
+        async with conn.transaction():
+            await grant_items(conn, user_id, totals)
+            await conn.execute(
+                "DELETE FROM farm_sessions WHERE session_id = ANY($1::int[])",
+                [farm["session_id"] for farm in finished],
+            )
+
+        items = await conn.fetch("SELECT id, name, icon FROM items WHERE id = ANY($1::int[])", list(totals))
+        labels = {item["id"]: f"{item['icon'] or ''} {item['name']}" for item in items}
+        for oid in totals:
+            labels.setdefault(oid, f"Unknown({oid})")
 
         total_collected = [f"{totals[oid]} x {labels[oid]}" for oid in sorted(totals.keys(), key=lambda k: labels[k])]
         return total_collected
 
     @farm.command(name="harvest", aliases=["collect"])
     async def farm_harvest(self, ctx):
-        await ensure_inventory(self.bot.db, ctx.author.id)
         async with self.bot.db.acquire() as conn:
             collected = await self._collect_finished_for_user(conn, ctx.author.id)
 
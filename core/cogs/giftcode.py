@@ -2,8 +2,10 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncpg
-from utils.db_helpers import ensure_user, ensure_inventory
+from utils.database import transaction
+from utils.db_helpers import ensure_user
 from utils.economy import calculate_multiplier, format_number
+from utils.wallet import credit
 class Giftcode(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -14,7 +16,7 @@ class Giftcode(commands.Cog):
         user_id = ctx.author.id
         await ensure_user(self.bot.db, user_id)  
         async with self.bot.db.acquire() as conn:
-            async with conn.transaction():
+            async with transaction(conn):
                 gift = await conn.fetchrow("SELECT * FROM giftcodes WHERE code = $1", code)
                 if not gift:
                     return await ctx.reply("❌ Invalid gift code.")
@@ -28,10 +30,8 @@ class Giftcode(commands.Cog):
                     return await ctx.reply("❌ You already redeemed this code.")
 
                 # Add reward
-                await conn.execute(
-                    "UPDATE users SET coins = coins + $1 WHERE id = $2",
-                    gift["prize"], user_id
-                )
+                if gift["prize"] > 0:
+                    await credit(conn, user_id, gift["prize"], reason="giftcode")
 
                 # Register redemption
                 await conn.execute(
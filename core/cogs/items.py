@@ -2,9 +2,10 @@ from datetime import timedelta
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.db_helpers import ensure_inventory, ensure_user
+from utils.db_helpers import ensure_user, take_item
 import traceback
 from utils.singleton import EffectID
+from utils.effects import RETURNING_EXPIRY, active_effects, settle_user
 import math
 from utils.parser import parse_amount, AmountParseError  # Added for flexible amount parsing
 
@@ -117,7 +118,6 @@ class Items(commands.Cog):
         await ctx.defer()
 
         user_id = ctx.author.id
-        await ensure_inventory(self.bot.db, user_id)
         await ensure_user(self.bot.db, user_id)
 
         try:
@@ -212,11 +212,11 @@ class Items(commands.Cog):
         await interaction.response.defer()
         user_id = interaction.user.id
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
         
        
         try:
             async with self.bot.db.acquire() as conn:
+                await settle_user(conn, user_id)
                 rows = await conn.fetch("""
                 SELECT inv.id, inv.quantity, inv.item_id,
                     eff.name AS effect_name,
@@ -305,11 +305,7 @@ class Items(commands.Cog):
                             WHERE id = $1
                         """, EffectID.ROB_PROTECT)
 
-                        current_effect = await conn.fetchrow("""
-                        SELECT * FROM current_effects WHERE user_id = $1 AND effect_id = $2 
-""", interaction.user.id, EffectID.ROB_PROTECT)
-                        
-                        if current_effect is not None:
+                        if active_effects.has(interaction.user.id, EffectID.ROB_PROTECT):
                             return await interaction.followup.send("You cant use the lock while it is active bruh")
                         if not effect_row:
                             return await interaction.followup.send("Rob data effect not found!")
@@ -319,10 +315,11 @@ class Items(commands.Cog):
                         effect_name = effect_row['name']
 
                         
-                        await conn.execute("""
+                        active_effects.track(await conn.fetchrow(f"""
                             INSERT INTO current_effects (user_id, effect_id, duration, ticks)
                             VALUES ($1, $2, $3, $4)
-                        """, user_id, EffectID.ROB_PROTECT, effect_value, effect_value)
+                            {RETURNING_EXPIRY}
+                        """, user_id, EffectID.ROB_PROTECT, effect_value, effect_value), conn)
                     if effect_name == "lottery_ticket":
                         # Use parsed_amount for lottery tickets
                         for _ in range(parsed_amount):
@@ -337,14 +334,17 @@ class Items(commands.Cog):
                 await conn.execute("UPDATE users SET energy = $1 WHERE id = $2", new_energy, user_id)
                 await conn.execute("UPDATE users SET energy_max = $1 WHERE id = $2", new_energy_max, user_id)
                 
-                # Trigger Replenished effect if energy reaches max
+                # Trigger Replenished effect if energy reaches max. The refresh
+                # restarts its tick count; settle_user above already applied
+                # the ticks owed so far on this connection.
                 if new_energy >= energy_max:
-                    await conn.execute("""
+                    active_effects.track(await conn.fetchrow(f"""
                         INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
                         VALUES ($1, $2, $3, $3, NOW())
                         ON CONFLICT (user_id, effect_id) DO UPDATE
                         SET duration = $3, ticks = $3, applied_at = NOW()
-                    """, user_id, EffectID.REPLENISHED, 120)
+                        {RETURNING_EXPIRY}
+                    """, user_id, EffectID.REPLENISHED, 120), conn)
                 if restore_total:
                     used_effects.append(f"⚡ Restored `{restore_total}` energy")
                 if energy_max_inc:
@@ -353,10 +353,7 @@ class Items(commands.Cog):
                     used_effects.append(f"⚡ Lost `{penalty}` energy for using multiple items")
 
                 # Update inventory (use parsed_amount)
-                if quantity == parsed_amount:
-                    await conn.execute("DELETE FROM inventory WHERE id = $1 AND item_id = $2", user_id, item_id)
-                else:
-                    await conn.execute("UPDATE inventory SET quantity = quantity - $1 WHERE id = $2 AND item_id = $3", parsed_amount, user_id, item_id)
+                await take_item(conn, user_id, item_id, parsed_amount)
 
                 if len(used_effects) > 20:
                     used_effects = ["Multiple items used."]
@@ -483,9 +480,7 @@ class Items(commands.Cog):
         await interaction.response.defer()
 
         await ensure_user(self.bot.db, interaction.user.id)
-        await ensure_inventory(self.bot.db, interaction.user.id)
         await ensure_user(self.bot.db, target.id)
-        await ensure_inventory(self.bot.db, target.id)
 
         if target.id == interaction.user.id:
             return await interaction.followup.send(embed=discord.Embed(
@@ -543,10 +538,7 @@ class Items(commands.Cog):
                         color=discord.Color.red()
                     ))
 
-                await conn.execute("""
-                    UPDATE inventory SET quantity = $1
-                    WHERE id = $2 AND item_id = $3
-                """, remain, interaction.user.id, item_id)
+                await take_item(conn, interaction.user.id, item_id, parsed_amount)
 
                 # Add to target inventory (use parsed_amount)
                 await conn.execute("""
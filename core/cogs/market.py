@@ -4,7 +4,9 @@ from datetime import datetime
 import traceback
 from typing import Optional, Any, Dict
 
-from utils.db_helpers import ensure_inventory, ensure_user
+from utils.database import transaction
+from utils.db_helpers import ensure_user, take_item
+from utils.wallet import transfer
 from utils.parser import parse_amount, AmountParseError  # Added for flexible amount parsing
 
 
@@ -184,7 +186,6 @@ class Market(commands.GroupCog, name="market"):
             return await ctx.send("Quantity and price must be > 0.")
 
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
 
         try:
             async with self.bot.db.acquire() as conn:
@@ -202,10 +203,7 @@ class Market(commands.GroupCog, name="market"):
                         return await ctx.send("You don't have enough of that item.")
 
                     # subtract from inventory and create trade (returning id)
-                    await conn.execute(
-                        "UPDATE inventory SET quantity = quantity - $1 WHERE id = $2 AND item_id = $3",
-                        quantity, user_id, item_row["id"]
-                    )
+                    await take_item(conn, user_id, item_row["id"], quantity)
 
                     # insert trade and return id
                     trade_row = await conn.fetchrow("""
@@ -241,11 +239,10 @@ class Market(commands.GroupCog, name="market"):
             return "Amount must be positive."
 
         await ensure_user(self.bot.db, buyer_id)
-        await ensure_inventory(self.bot.db, buyer_id)
 
         try:
             async with self.bot.db.acquire() as conn:
-                async with conn.transaction():
+                async with transaction(conn):
                     # lock the trade row
                     trade = await conn.fetchrow("SELECT * FROM trades WHERE id = $1 FOR UPDATE", trade_id)
                     if not trade:
@@ -259,22 +256,13 @@ class Market(commands.GroupCog, name="market"):
 
                     total_cost = trade["price"] * amount
 
-                    # lock buyer row
-                    buyer = await conn.fetchrow("SELECT coins FROM users WHERE id = $1 FOR UPDATE", buyer_id)
-                    if not buyer:
-                        return "Buyer not found."
-
-                    if buyer["coins"] < total_cost:
-                        return "You don't have enough coins."
-
-                    # lock seller row (for safety)
-                    seller = await conn.fetchrow("SELECT coins FROM users WHERE id = $1 FOR UPDATE", trade["offerer_id"])
+                    seller = await conn.fetchval("SELECT 1 FROM users WHERE id = $1", trade["offerer_id"])
                     if not seller:
                         return "Seller not found."
 
-                    # transfer coins
-                    await conn.execute("UPDATE users SET coins = coins - $1 WHERE id = $2", total_cost, buyer_id)
-                    await conn.execute("UPDATE users SET coins = coins + $1 WHERE id = $2", total_cost, trade["offerer_id"])
+                    # transfer coins; the buyer's balance is checked by the update itself
+                    if await transfer(conn, buyer_id, trade["offerer_id"], total_cost, reason="market") is None:
+                        return "You don't have enough coins."
 
                     # update or delete trade
                     new_quantity = trade["quantity"] - amount
@@ -310,7 +298,6 @@ class Market(commands.GroupCog, name="market"):
         Returns integer (quantity returned) on success, or str error.
         """
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
 
         try:
             async with self.bot.db.acquire() as conn:
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 
 from utils.db_helpers import *
 from utils.singleton import ItemID
+from utils.effects import settle_user
+from utils.cache import TTLCache
 
 # Mining Results View with continue button
 class MiningResultsView(discord.ui.View):
@@ -92,11 +94,12 @@ ZONE_DIAMOND_ABYSS = (50, float('inf'))
 class Mining(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Initialize mining depth tracking (cache-based)
+        # Initialize mining depth tracking (cache-based). Depth is forgotten
+        # after a few idle hours, which sends the player back to the surface.
         if not hasattr(bot, 'mining_depth_cache'):
-            bot.mining_depth_cache = {}
+            bot.mining_depth_cache = TTLCache("mining_depth", ttl=6 * 60 * 60, maxsize=100_000)
         if not hasattr(bot, 'mining_events_cache'):
-            bot.mining_events_cache = {}
+            bot.mining_events_cache = TTLCache("mining_events", ttl=5 * 60, maxsize=100_000)
 
     def get_zone_info(self, depth):
         """Determine mining zone based on depth"""
@@ -158,18 +161,12 @@ class Mining(commands.Cog):
 
     def check_event_cooldown(self, user_id, event_type):
         """Check if user is on cooldown for specific event"""
-        cache_key = f"{user_id}_{event_type}"
-        if cache_key in self.bot.mining_events_cache:
-            last_event = self.bot.mining_events_cache[cache_key]
-            # 5 minute cooldown per event type
-            if datetime.now() - last_event < timedelta(minutes=5):
-                return False
-        return True
+        # 5 minute cooldown per event type, enforced by the cache TTL
+        return (user_id, event_type) not in self.bot.mining_events_cache
 
     def set_event_cooldown(self, user_id, event_type):
         """Set cooldown for specific event"""
-        cache_key = f"{user_id}_{event_type}"
-        self.bot.mining_events_cache[cache_key] = datetime.now()
+        self.bot.mining_events_cache[(user_id, event_type)] = datetime.now()
 
     async def process_mining_event(self, conn, user_id, depth, user):
         """Process random mining events"""
@@ -244,17 +241,7 @@ class Mining(commands.Cog):
         
         elif event_type == 'treasure_room':
             # 10x Diamond Ore, 5x Gold Bar
-            await conn.execute("""
-                INSERT INTO inventory (id, item_id, quantity)
-                VALUES ($1, $2, 10)
-                ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + 10
-            """, user_id, ItemID.DIAMOND_ORE)
-            
-            await conn.execute("""
-                INSERT INTO inventory (id, item_id, quantity)
-                VALUES ($1, $2, 5)
-                ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + 5
-            """, user_id, ItemID.GOLD_BAR)
+            await grant_items(conn, user_id, {ItemID.DIAMOND_ORE: 10, ItemID.GOLD_BAR: 5})
             
             return {
                 'type': 'treasure_room',
@@ -269,6 +256,7 @@ class Mining(commands.Cog):
     async def show_mining_panel(self, ctx_or_interaction, user_id, edit=False, mining_results=None):
         """Show the mining interface panel"""
         async with self.bot.db.acquire() as conn:
+            await settle_user(conn, user_id)
             user = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
 
             # Get or initialize depth
@@ -377,7 +365,6 @@ class Mining(commands.Cog):
         await ctx.defer()
         try:
             await ensure_user(self.bot.db, ctx.author.id)
-            await ensure_inventory(self.bot.db, ctx.author.id)
             
             await self.show_mining_panel(ctx, ctx.author.id)
             
@@ -396,6 +383,7 @@ class Mining(commands.Cog):
         base_cost = 10
         try:
             async with self.bot.db.acquire() as conn:
+                await settle_user(conn, user_id)
                 user = await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
                 if not user or user["energy"] < base_cost:
                     return "error", {
@@ -448,12 +436,8 @@ class Mining(commands.Cog):
                         quantity = ore_multiplier
                         loot_items.append((item_id, quantity))
 
-                        # Add to inventory
-                        await conn.execute("""
-                            INSERT INTO inventory (id, item_id, quantity)
-                            VALUES ($1, $2, $3)
-                            ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + $3
-                        """, user_id, item_id, quantity)
+                # Add to inventory
+                await grant_items(conn, user_id, dict(loot_items))
 
                 # Increase depth by 1-3 meters (unless cave-in)
                 if not (event_result and event_result['type'] == 'cave_in'):
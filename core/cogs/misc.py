@@ -13,30 +13,26 @@ import aiohttp
 import pycountry
 from rapidfuzz import process, fuzz
 from utils.translation import translate as tr, translate_bulk
-from utils.db_helpers import ensure_user
+from utils.db_helpers import ensure_user, compact_inventory, rebuild_family_closure
+from utils.command_sync import sync_if_changed
+from utils.cache import TTLCache, all_caches
+from utils.ledger import coin_ledger, reconcile
 temp_store = {}
 
 load_dotenv()
 OWM_API_KEY = os.getenv("OWM_API_KEY")
 
 # --------- Cache: simple TTL cache (5 minutes) ---------
-_weather_cache = {}
 CACHE_TTL_SECONDS = 300  # 5 minutes
+_weather_cache = TTLCache("weather", ttl=CACHE_TTL_SECONDS, maxsize=1024)
 
 
 def _cache_get(key):
-    entry = _weather_cache.get(key)
-    if not entry:
-        return None
-    ts, value = entry
-    if (datetime.datetime.utcnow() - ts).total_seconds() > CACHE_TTL_SECONDS:
-        del _weather_cache[key]
-        return None
-    return value
+    return _weather_cache.get(key)
 
 
 def _cache_set(key, value):
-    _weather_cache[key] = (datetime.datetime.utcnow(), value)
+    _weather_cache[key] = value
 
 
 # --------- Fuzzy country lookup to tolerate typos ----------
@@ -337,6 +333,85 @@ class Ping(commands.Cog):
             error_msg = await tr("Database error", interaction)
             await interaction.followup.send(f"{error_msg}: `{e}`")
 
+    @commands.command(name="pool-stats")
+    @commands.is_owner()
+    async def pool_stats(self, ctx):
+        """Show database pool usage and acquire latency"""
+        stats = self.bot.db.snapshot()
+        buckets = "\n".join(
+            f"<= {'inf' if bound == float('inf') else f'{bound * 1000:g}ms'}: {count}"
+            for bound, count in stats["histogram"]
+        )
+        await ctx.send(
+            f"**Pool** size `{stats['size']}` (min `{stats['min_size']}`, max `{stats['max_size']}`), "
+            f"idle `{stats['idle']}`, in use `{stats['in_use']}`\n"
+            f"waiting `{stats['waiting']}` (peak `{stats['max_waiting']}`), "
+            f"acquired `{stats['acquired']}`, timeouts `{stats['timeouts']}`, "
+            f"avg wait `{stats['avg_wait_ms']:.2f}ms`\n"
+            f"```{buckets}```"
+        )
+
+    @commands.command(name="cache-stats")
+    @commands.is_owner()
+    async def cache_stats(self, ctx):
+        """Show size and hit/miss counters of every in-memory cache"""
+        lines = [
+            f"{name}: {stats['size']}/{stats['maxsize']} hits {stats['hits']} misses {stats['misses']} "
+            f"evicted {stats['evictions']} expired {stats['expirations']}"
+            for name, stats in ((name, cache.stats()) for name, cache in sorted(all_caches().items()))
+        ]
+        await ctx.send("```" + ("\n".join(lines) or "No caches") + "```")
+
+    @commands.command(name="jobs")
+    @commands.is_owner()
+    async def jobs(self, ctx):
+        """List background jobs with their last run time and failures"""
+        lines = []
+        for name, job in sorted(self.bot.scheduler.jobs.items()):
+            last = f"{job.last_duration * 1000:.0f}ms" if job.last_duration is not None else "never"
+            next_run = self.bot.scheduler.next_run(name)
+            state = "running" if job.running else f"next {next_run:%H:%M:%S}" if next_run else "next —"
+            lines.append(f"{name}: runs {job.runs} failed {job.failures} skipped {job.skipped} last {last} {state}")
+            if job.last_error:
+                lines.append(f"  last error: {job.last_error}")
+        await ctx.send("```" + ("\n".join(lines) or "No jobs") + "```")
+
+    @commands.command(name="compact-inventory")
+    @commands.is_owner()
+    async def compact_inventory_cmd(self, ctx):
+        """Delete the empty inventory rows left over from the dense model"""
+        removed = await compact_inventory(self.bot.db)
+        await ctx.send(f"Removed `{removed}` empty inventory rows.")
+
+    @commands.command(name="rebuild-family-closure")
+    @commands.is_owner()
+    async def rebuild_family_closure_cmd(self, ctx):
+        """Recompute the family ancestor closure table from parents"""
+        rows = await rebuild_family_closure(self.bot.db)
+        await ctx.send(f"Rebuilt family closure: `{rows}` rows.")
+
+    @commands.command(name="ledger-reconcile")
+    @commands.is_owner()
+    async def ledger_reconcile(self, ctx):
+        """Flush the coin ledger and list users whose balance differs from their ledger total"""
+        flushed = await coin_ledger.flush()
+        async with self.bot.db.acquire() as conn:
+            rows = await reconcile(conn)
+        lines = [f"{r['user_id']}: coins {r['coins']} ledger {r['ledger']} drift {r['drift']:+}" for r in rows]
+        await ctx.send(
+            ("" if flushed else "Flush timed out, queued entries are not counted yet.\n")
+            + f"**Ledger** written `{coin_ledger.written}`, queued `{coin_ledger.qsize()}`, "
+            f"failed writes `{coin_ledger.failures}`, dropped `{coin_ledger.dropped}`\n"
+            "```" + ("\n".join(lines) or "No drift") + "```"
+        )
+
+    @commands.command(name="sync-commands")
+    @commands.is_owner()
+    async def sync_commands(self, ctx):
+        """Force an app-command sync, ignoring the stored tree hash"""
+        synced = await sync_if_changed(self.bot.tree, force=True)
+        await ctx.send(f"Synced `{len(synced)}` app commands.")
+
     @app_commands.command(name='coinflip', description='Flip a coin')
     @app_commands.describe(rig="Choose if you want to rig the coin")
     @app_commands.choices(rig=[
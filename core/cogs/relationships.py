@@ -220,9 +220,10 @@ class PartnerSelectView(discord.ui.View):
 
     async def create_options(self):
         options = []
+        profiles = await self.bot.profiles.fetch_many(self.partners)
         for i, partner_id in enumerate(self.partners):
             try:
-                partner = await self.bot.fetch_user(partner_id)
+                partner = profiles[partner_id]
                 partner_name = partner.name[:20]
                 options.append(discord.SelectOption(
                     label=f"{partner_name}",
@@ -270,9 +271,10 @@ class ChildSelectView(discord.ui.View):
 
     async def create_options(self):
         options = []
+        profiles = await self.bot.profiles.fetch_many(self.child_ids)
         for i, child_id in enumerate(self.child_ids):
             try:
-                child = await self.bot.fetch_user(child_id)
+                child = profiles[child_id]
                 child_name = child.name[:20]  # Truncate long names
                 options.append(discord.SelectOption(
                     label=f"{child_name}",
@@ -314,6 +316,10 @@ class Relationship(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        # Kinship checks read family_closure; build it on first deploy
+        await ensure_family_closure(self.bot.db)
+
     def _get_user_friendly_error(self, error_msg: str) -> str:
         """Convert database error messages to user-friendly messages"""
         error_mappings = {
@@ -422,8 +428,8 @@ class Relationship(commands.Cog):
             )
 
             try:
-                proposer = await self.bot.fetch_user(proposer_id)
-                target = await self.bot.fetch_user(target_id)
+                proposer = await self.bot.profiles.fetch(proposer_id)
+                target = await self.bot.profiles.fetch(target_id)
                 embed.add_field(
                     name=":ring: Newlyweds :ring:",
                     value=f"{proposer.mention} + {target.mention}",
@@ -460,13 +466,13 @@ class Relationship(commands.Cog):
                 target_mention = f"<@{target_id}>"
                 
                 try:
-                    proposer = await self.bot.fetch_user(proposer_id)
+                    proposer = await self.bot.profiles.fetch(proposer_id)
                     proposer_mention = proposer.mention
                 except:
                     pass
                 
                 try:
-                    target = await self.bot.fetch_user(target_id)
+                    target = await self.bot.profiles.fetch(target_id)
                     target_mention = target.mention
                 except:
                     pass
@@ -563,8 +569,8 @@ class Relationship(commands.Cog):
             logger.info(f"Adoption completed between adopter {adopter_id} and child {target_id}")
 
             try:
-                adopter = await self.bot.fetch_user(adopter_id)
-                target = await self.bot.fetch_user(target_id)
+                adopter = await self.bot.profiles.fetch(adopter_id)
+                target = await self.bot.profiles.fetch(target_id)
                 embed = discord.Embed(
                     title=":family: Adoption Complete!",
                     description=f"{adopter.mention} has successfully adopted {target.mention}!",
@@ -600,13 +606,13 @@ class Relationship(commands.Cog):
                 target_mention = f"<@{target_id}>"
                 
                 try:
-                    adopter = await self.bot.fetch_user(adopter_id)
+                    adopter = await self.bot.profiles.fetch(adopter_id)
                     adopter_mention = adopter.mention
                 except:
                     pass
                 
                 try:
-                    target = await self.bot.fetch_user(target_id)
+                    target = await self.bot.profiles.fetch(target_id)
                     target_mention = target.mention
                 except:
                     pass
@@ -643,7 +649,7 @@ class Relationship(commands.Cog):
         if len(partners) == 1:
             partner_id = partners[0]
             try:
-                partner = await self.bot.fetch_user(partner_id)
+                partner = await self.bot.profiles.fetch(partner_id)
                 embed = discord.Embed(
                     title="Divorce Confirmation",
                     description=f"Are you sure you want to divorce {partner.mention}?",
@@ -688,8 +694,8 @@ class Relationship(commands.Cog):
             )
 
             try:
-                user = await self.bot.fetch_user(user_id)
-                partner = await self.bot.fetch_user(partner_id)
+                user = await self.bot.profiles.fetch(user_id)
+                partner = await self.bot.profiles.fetch(partner_id)
                 embed.add_field(
                     name="Former Couple",
                     value=f"{user.mention} ↔ {partner.mention}",
@@ -732,7 +738,7 @@ class Relationship(commands.Cog):
         if len(children) == 1:
             child_id = children[0]
             try:
-                child = await self.bot.fetch_user(child_id)
+                child = await self.bot.profiles.fetch(child_id)
                 embed = discord.Embed(
                     title="Disown Confirmation",
                     description=f"Are you sure you want to disown {child.mention}?",
@@ -778,7 +784,7 @@ class Relationship(commands.Cog):
 
         parent_info = []
         try:
-            parent = await self.bot.fetch_user(parent_id)
+            parent = await self.bot.profiles.fetch(parent_id)
             parent_info.append(f" {parent.name}")
         except:
             parent_info.append(f" <@{parent_id}>")
@@ -817,8 +823,8 @@ class Relationship(commands.Cog):
             )
 
             try:
-                user = await self.bot.fetch_user(user_id)
-                child = await self.bot.fetch_user(child_id)
+                user = await self.bot.profiles.fetch(user_id)
+                child = await self.bot.profiles.fetch(child_id)
                 embed.add_field(
                     name="Former Parent-Child",
                     value=f"{user.mention} ↔ {child.mention}",
@@ -858,7 +864,7 @@ class Relationship(commands.Cog):
             )
 
             try:
-                user = await self.bot.fetch_user(user_id)
+                user = await self.bot.profiles.fetch(user_id)
                 embed.add_field(
                     name="You",
                     value=f"{user.mention}",
@@ -910,12 +916,14 @@ class Relationship(commands.Cog):
                 color=discord.Color.blue()
             )
             embed.set_author(name=target.display_name, icon_url=target.display_avatar.url)
+            parent_ids = await get_parents(self.bot.db, target.id)
+            profiles = await self.bot.profiles.fetch_many([*(partners or []), *(children or []), *(parent_ids or [])])
 
             if partners:
                 partner_info = []
                 for partner_id in partners:
                     try:
-                        partner_user = await self.bot.fetch_user(partner_id)
+                        partner_user = profiles[partner_id]
                         partner_name = partner_user.name
                         marriage_date_obj = await get_marriage_date(self.bot.db, target.id, partner_id)
                         marriage_date = format_discord_timestamp(ensure_utc(marriage_date_obj), "D")
@@ -939,7 +947,7 @@ class Relationship(commands.Cog):
                 child_info = []
                 for child_id in children:
                     try:
-                        child_user = await self.bot.fetch_user(child_id)
+                        child_user = profiles[child_id]
                         child_info.append(f" {child_user.name}")
                     except:
                         child_info.append(f"<@{child_id}>")
@@ -956,12 +964,11 @@ class Relationship(commands.Cog):
                     inline=False
                 )
 
-            parent_ids = await get_parents(self.bot.db, target.id)
             if parent_ids:
                 parent_info = []
                 for parent_id in parent_ids:
                     try:
-                        parent_user = await self.bot.fetch_user(parent_id)
+                        parent_user = profiles[parent_id]
                         parent_info.append(f"👨‍👩‍👧‍👦 {parent_user.name}")
                     except:
                         parent_info.append(f"👨‍👩‍👧‍👦 <@{parent_id}>")
@@ -1005,12 +1012,10 @@ class Relationship(commands.Cog):
             dot_lines.append('  size="10,10";')
 
             user_names = {}
+            profiles = await self.bot.profiles.fetch_many(member['id'] for member in family_data)
             for member in family_data:
-                try:
-                    user = await self.bot.fetch_user(member['id'])
-                    user_names[member['id']] = user.name[:20]
-                except:
-                    user_names[member['id']] = f"User {member['id']}"
+                profile = profiles.get(member['id'])
+                user_names[member['id']] = profile.name[:20] if profile else f"User {member['id']}"
 
             # Group members by generation for rank constraints
             generations = {}
@@ -3,8 +3,9 @@ from discord import app_commands
 import discord
 import random
 import asyncio
-from utils.db_helpers import ensure_user, ensure_inventory
+from utils.db_helpers import ensure_user, take_item, grant_items
 from utils.singleton import EffectID, ItemID
+from utils.effects import RETURNING_EXPIRY, active_effects, settle_user
 from utils.enemy_rpg_class import *
 
 class RPGAdventure(commands.Cog):
@@ -19,16 +20,9 @@ class RPGAdventure(commands.Cog):
 
         user_id = interaction.user.id
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
 
-        async with self.bot.db.acquire() as conn:
-            is_injured = await conn.fetchval("""
-                SELECT 1 FROM current_effects
-                WHERE user_id = $1 AND effect_id = $2
-            """, user_id, EffectID.INJURED)
-
-            if is_injured:
-                return await interaction.followup.send("ur injured! rest 5 mins before adventuring again")
+        if active_effects.has(user_id, EffectID.INJURED):
+            return await interaction.followup.send("ur injured! rest 5 mins before adventuring again")
 
         if user_id in self.battle_sessions or user_id in self.safe_zone_sessions:
             return await interaction.followup.send("ur already adventuring bro")
@@ -183,10 +177,7 @@ class RPGAdventure(commands.Cog):
 
                     battle_data['ammo_count'] = current_ammo + ammo_to_reload
 
-                    await conn.execute("""
-                        UPDATE inventory SET quantity = quantity - $3
-                        WHERE id = $1 AND item_id = $2
-                    """, user_id, action['ammo_item_id'], ammo_to_reload)
+                    await take_item(conn, user_id, action['ammo_item_id'], ammo_to_reload)
 
                     player_message = f"Reloaded {action['weapon_name']}! +{ammo_to_reload} ammo ({battle_data['ammo_count']}/{mag_capacity})"
 
@@ -414,10 +405,7 @@ Enter action number:
                         loot_messages.append(f"Got {amount}x {item_name}")
 
             if battle_data.get('weapon_broken', False):
-                await conn.execute("""
-                    UPDATE inventory SET quantity = quantity - 1
-                    WHERE id = $1 AND item_id = $2 AND quantity > 0
-                """, user_id, battle_data['weapon_id'])
+                await take_item(conn, user_id, battle_data['weapon_id'], 1)
                 status_messages.append("Your weapon broke!")
 
             weapon_stats = await conn.fetchrow("""
@@ -428,18 +416,16 @@ Enter action number:
                 initial_ammo = battle_data.get('initial_ammo', battle_data['ammo_count'])
                 ammo_used = initial_ammo - battle_data['ammo_count']
                 if ammo_used > 0:
-                    await conn.execute("""
-                        UPDATE inventory SET quantity = quantity - $3
-                        WHERE id = $1 AND item_id = $2
-                    """, user_id, weapon_stats['ammo_item_id'], ammo_used)
+                    await take_item(conn, user_id, weapon_stats['ammo_item_id'], ammo_used)
 
             if result == "defeat":
-                await conn.execute("""
+                active_effects.track(await conn.fetchrow(f"""
                     INSERT INTO current_effects (user_id, effect_id, duration, ticks)
                     VALUES ($1, $2, $3, $4)
                     ON CONFLICT (user_id, effect_id) DO UPDATE
                     SET duration = $3, ticks = $4
-                """, user_id, EffectID.INJURED, 300, 300)
+                    {RETURNING_EXPIRY}
+                """, user_id, EffectID.INJURED, 300, 300), conn)
                 status_messages.append("You're injured! Rest for 5 minutes.")
 
         # Create result message
@@ -596,10 +582,7 @@ Enter item number:
             else:
                 message = f"Used {item_name}! (Effect: {effect_value})"
 
-            await conn.execute("""
-                UPDATE inventory SET quantity = quantity - 1
-                WHERE id = $1 AND item_id = $2
-            """, user_id, item_id)
+            await take_item(conn, user_id, item_id, 1)
 
         await self.update_safe_zone_message(user_id, message)
 
@@ -737,14 +720,11 @@ Enter weapon number:
         session_data = self.safe_zone_sessions.pop(user_id)
 
         if session_data['loot']:
+            loot = {}
+            for loot_item in session_data['loot']:
+                loot[loot_item['id']] = loot.get(loot_item['id'], 0) + loot_item['amount']
             async with self.bot.db.acquire() as conn:
-                for loot_item in session_data['loot']:
-                    await conn.execute("""
-                        INSERT INTO inventory (id, item_id, quantity)
-                        VALUES ($1, $2, $3)
-                        ON CONFLICT (id, item_id) DO UPDATE
-                        SET quantity = inventory.quantity + $3
-                    """, user_id, loot_item['id'], loot_item['amount'])
+                await grant_items(conn, user_id, loot)
 
         message = f"""
 **Returned Home**
@@ -765,6 +745,7 @@ Final Health: {session_data['player_health']}/{session_data['player_max_health']
         session_data = self.safe_zone_sessions[user_id]
 
         async with self.bot.db.acquire() as conn:
+            await settle_user(conn, user_id)
             user_data = await conn.fetchrow("SELECT energy FROM users WHERE id = $1", user_id)
             if user_data and user_data['energy'] > 0:
                 await conn.execute("UPDATE users SET energy = energy - 1 WHERE id = $1", user_id)
@@ -823,6 +804,7 @@ Enemy encountered! Choose your action:
         session_data = self.safe_zone_sessions[user_id]
 
         async with self.bot.db.acquire() as conn:
+            await settle_user(conn, user_id)
             user_data = await conn.fetchrow("SELECT energy, energy_max FROM users WHERE id = $1", user_id)
             current_energy = user_data['energy'] if user_data else 0
             max_energy = user_data['energy_max'] if user_data else 100
@@ -7,13 +7,13 @@ import aiohttp, traceback
 from utils.db_helpers import (
     ensure_user,
     get_user_partners,
-    get_user_children,
-    get_parent,
-    get_parents,
-    is_too_closely_related,
+    get_kinship,
 )
 from dotenv import load_dotenv
 from utils.singleton import EffectID
+from utils.effects import RETURNING_EXPIRY, active_effects, settle_user
+from utils.wallet import transfer
+from utils.cache import TTLCache
 from utils.translation import translate as tr, translate_bulk
 import logging
 
@@ -22,8 +22,8 @@ from datetime import datetime, timedelta
 
 # Track user's last active guild and timestamp
 # Format: {user_id: (guild_id, last_seen_timestamp)}
-user_current_guild = {}
 ACTIVITY_TIMEOUT = timedelta(minutes=30)  # User must have chatted in last 30 minutes
+user_current_guild = TTLCache("user_current_guild", ttl=ACTIVITY_TIMEOUT.total_seconds(), maxsize=200_000)
 
 load_dotenv()
 
@@ -46,58 +46,30 @@ class RPG_MISC(commands.Cog):
         if target_id in partners:
             return True, "partner"
 
-        children = await get_user_children(self.bot.db, user_id)
-        if target_id in children:
+        kin = await get_kinship(self.bot.db, user_id, target_id, depth=3)
+        if kin["is_child"]:
             return True, "child"
-
-        parent_ids = await get_parents(self.bot.db, user_id)
-        if target_id in parent_ids:
+        if kin["is_parent"]:
             return True, "parent"
 
-        # Reverse check: target considers user as parent
-        target_parent_ids = await get_parents(self.bot.db, target_id)
-        if user_id in target_parent_ids:
-            return True, "child"
-
         # Check for siblings (common parent)
-        common_parents = set(parent_ids) & set(target_parent_ids)
-        if common_parents:
+        if kin["is_sibling"]:
             return True, "sibling"
 
         # Check for extended family relationships (up to 3 generations)
-        is_related = await is_too_closely_related(self.bot.db, user_id, target_id, depth=3)
-        if is_related:
+        if kin["is_extended"]:
             return True, "extended_family"
 
         # Check for ancestor/descendant relationship
-        async with self.bot.db.acquire() as conn:
-            is_ancestor = await conn.fetchval("""
-                WITH RECURSIVE ancestors(id) AS (
-                    SELECT parent_id FROM parents WHERE child_id = $1
-                    UNION
-                    SELECT p.parent_id FROM parents p JOIN ancestors a ON p.child_id = a.id
-                )
-                SELECT EXISTS(SELECT 1 FROM ancestors WHERE id = $2)
-            """, user_id, target_id)
-
-            if is_ancestor:
-                return True, "ancestor"
-
-            is_descendant = await conn.fetchval("""
-                WITH RECURSIVE descendants(id) AS (
-                    SELECT child_id FROM parents WHERE parent_id = $1
-                    UNION
-                    SELECT p.child_id FROM parents p JOIN descendants d ON p.parent_id = d.id
-                )
-                SELECT EXISTS(SELECT 1 FROM descendants WHERE id = $2)
-            """, user_id, target_id)
-
-            if is_descendant:
-                return True, "descendant"
+        if kin["is_ancestor"]:
+            return True, "ancestor"
+        if kin["is_descendant"]:
+            return True, "descendant"
 
         return False, ""
 
     async def add_mood(self, conn, user_id: int, amount: int):
+        await settle_user(conn, user_id)
         row = await conn.fetchrow("SELECT mood, mood_max FROM users WHERE id = $1", user_id)
         if not row:
             return
@@ -106,12 +78,13 @@ class RPG_MISC(commands.Cog):
 
     async def maybe_apply_social_buff(self, conn, user_id: int):
         if random.random() < 0.20:
-            await conn.execute("""
+            active_effects.track(await conn.fetchrow(f"""
                 INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
                 VALUES ($1, 8, 120, 120, NOW())
                 ON CONFLICT (user_id, effect_id)
                 DO UPDATE SET duration = 120, ticks = 120, applied_at = NOW()
-            """, user_id)
+                {RETURNING_EXPIRY}
+            """, user_id), conn)
 
     async def fetch_gif(self, query: str) -> str | None:
         giphy_api_key = os.getenv("GIPHY_API_KEY")
@@ -403,11 +376,12 @@ class RPG_MISC(commands.Cog):
         config = mode_config[mode]
 
         async with self.bot.db.acquire() as conn:
+            await settle_user(conn, ctx.author.id)
             user_row = await conn.fetchrow(
                 "SELECT coins, energy, mood, mood_max FROM users WHERE id = $1", ctx.author.id
             )
             target_row = await conn.fetchrow("SELECT coins FROM users WHERE id = $1", target.id)
-            rob_allowed = await conn.fetchval("SELECT allow_rob FROM guild_config WHERE guild_id = $1", ctx.guild.id)
+            rob_allowed = self.bot.guild_config.allow_rob(ctx.guild.id)
             # Check if target has been active in this guild recently
             target_activity = user_current_guild.get(target.id)
             target_is_here = False
@@ -433,12 +407,11 @@ class RPG_MISC(commands.Cog):
                     color=discord.Color.red()
                 ), ephemeral=True)
             # check rob protection
-            target_effect = await conn.fetchrow("""
-                SELECT user_effects.icon, user_effects.name
-                FROM current_effects
-                INNER JOIN user_effects ON current_effects.effect_id = user_effects.id
-                WHERE current_effects.user_id = $1 AND current_effects.effect_id = $2
-            """, target.id, EffectID.ROB_PROTECT)
+            target_effect = None
+            if active_effects.has(target.id, EffectID.ROB_PROTECT):
+                target_effect = await conn.fetchrow(
+                    "SELECT icon, name FROM user_effects WHERE id = $1", EffectID.ROB_PROTECT
+                )
 
             if target_effect:
                 return await ctx.reply(embed=discord.Embed(
@@ -461,8 +434,17 @@ class RPG_MISC(commands.Cog):
             elif user_row["mood"] < 20:
                 success_chance -= 0.1
 
-            # Deduct energy
-            await conn.execute("UPDATE users SET energy = energy - $1 WHERE id = $2", config["energy"], ctx.author.id)
+            # Deduct energy; the check is repeated in the UPDATE so a parallel
+            # command cannot take it below zero
+            if await conn.fetchval(
+                "UPDATE users SET energy = energy - $1 WHERE id = $2 AND energy >= $1 RETURNING energy",
+                config["energy"], ctx.author.id,
+            ) is None:
+                return await ctx.reply(embed=discord.Embed(
+                    title="Warning. Energy insufficient",
+                    description=f"Minimum {config['energy']} required. Rest or consume energy items.",
+                    color=discord.Color.red()
+                ), ephemeral=True)
 
             if target_row["coins"] <= 0:
                 await conn.execute("UPDATE users SET mood = GREATEST(mood - 5, 0) WHERE id = $1", ctx.author.id)
@@ -474,8 +456,14 @@ class RPG_MISC(commands.Cog):
 
             if random.random() < success_chance:
                 amount = max(1, int(target_row["coins"] * config["multiplier"]))
-                await conn.execute("UPDATE users SET coins = coins - $1 WHERE id = $2", amount, target.id)
-                await conn.execute("UPDATE users SET coins = coins + $1, mood = LEAST(mood + 5, mood_max) WHERE id = $2", amount, ctx.author.id)
+                # The target may have spent since target_row was read; the
+                # transfer only goes through if they still hold `amount`
+                if await transfer(conn, target.id, ctx.author.id, amount, to_mood=5, reason="rob") is None:
+                    return await ctx.reply(embed=discord.Embed(
+                        title="Robbery failed",
+                        description=f"Target {target.mention}. No funds detected.",
+                        color=discord.Color.red()
+                    ))
 
                 embed = discord.Embed(
                     title="Robbery successful",
@@ -516,10 +504,11 @@ class RPG_MISC(commands.Cog):
                 msg = await tr("Resting effect not found! ERROR", ctx)
                 return await ctx.reply(msg)
 
-            await conn.execute("""
+            active_effects.track(await conn.fetchrow(f"""
                 INSERT INTO current_effects (user_id, effect_id, duration, ticks)
                 VALUES ($1, $2, $3, $4)
-            """, user_id, EffectID.REST, 1000000, 1000000)
+                {RETURNING_EXPIRY}
+            """, user_id, EffectID.REST, 1000000, 1000000), conn)
 
             translations = await translate_bulk([
                 "Applied",
@@ -581,6 +570,8 @@ class RPG_MISC(commands.Cog):
             pass
 
         user_id = message.author.id
+        if not active_effects.has(user_id, EffectID.REST):
+            return  # not resting
         try:
             async with self.bot.db.acquire() as conn:
                 effect_row = await conn.fetchrow(
@@ -592,9 +583,13 @@ class RPG_MISC(commands.Cog):
                 )
 
                 if not effect_row:
+                    active_effects.untrack(user_id, EffectID.REST, conn)
                     return  # not resting
 
+                # Credit the energy rested so far before the effect is removed
+                await settle_user(conn, user_id)
                 await conn.execute("DELETE FROM current_effects WHERE user_id = $1 AND effect_id = $2", user_id, EffectID.REST)
+                active_effects.untrack(user_id, EffectID.REST, conn)
 
                 icon = effect_row.get("icon") or ""
                 name = effect_row.get("name") or "Resting"
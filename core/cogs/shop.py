@@ -1,7 +1,8 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.db_helpers import ensure_user, ensure_inventory, log_spending
+from utils.db_helpers import ensure_user, log_spending
+from utils.wallet import debit
 import traceback
 import logging
 from utils.parser import parse_amount, AmountParseError  # Added for flexible amount parsing
@@ -79,7 +80,6 @@ class Shop(commands.Cog):
         user_id = interaction.user.id
 
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
 
         try:
             async with self.bot.db.acquire() as conn:
@@ -117,13 +117,9 @@ class Shop(commands.Cog):
 
                 total_price = price * parsed_amount
 
-                # Check user's coin balance
-                coins = await conn.fetchval("SELECT coins FROM users WHERE id = $1", user_id)
-                if coins is None or coins < total_price:
+                # Deduct coins from user if the balance covers it
+                if await debit(conn, user_id, total_price, reason="shop") is None:
                     return await interaction.followup.send(" You don't have enough coins.", ephemeral=True)
-
-                # Deduct coins from user
-                await conn.execute("UPDATE users SET coins = coins - $1 WHERE id = $2", total_price, user_id)
                 await log_spending(self.bot.db, total_price)
                 # Update inventory (use parsed_amount)
                 await conn.execute("""
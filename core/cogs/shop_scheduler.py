@@ -1,18 +1,18 @@
 from discord.ext import commands
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 import random
 
 class ShopScheduler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.scheduler = AsyncIOScheduler()
-        self.scheduler.add_job(
+        self.bot.scheduler.cron(
+            "daily_shop_reset",
             self.reset_shop,
-            CronTrigger(hour=0, minute=0, timezone="Asia/Bangkok"),  # UTC+7
-            name="Daily Shop Reset"
+            hour=0, minute=0, timezone="Asia/Bangkok",  # UTC+7
+            jitter=30,
         )
-        self.scheduler.start()
+
+    def cog_unload(self):
+        self.bot.scheduler.unregister("daily_shop_reset")
 
     async def reset_shop(self):
         try:
@@ -1,19 +1,19 @@
 from discord.ext import commands
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 import random
 
 class TradeQuestScheduler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.scheduler = AsyncIOScheduler()
         # Run daily at 0:00 UTC+7 (Asia/Bangkok timezone)
-        self.scheduler.add_job(
+        self.bot.scheduler.cron(
+            "trade_quest_generation",
             self.generate_trade_quests,
-            CronTrigger(hour=0, minute=0, timezone='Asia/Bangkok'),
-            name="Trade Quest Generation"
+            hour=0, minute=0, timezone='Asia/Bangkok',
+            jitter=30,
         )
-        self.scheduler.start()
+
+    def cog_unload(self):
+        self.bot.scheduler.unregister("trade_quest_generation")
 
     async def generate_trade_quests(self):
         try:
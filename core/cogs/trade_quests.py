@@ -5,7 +5,9 @@ import random
 import traceback
 from typing import Optional, Any, Dict
 
-from utils.db_helpers import ensure_inventory, ensure_user
+from utils.database import transaction
+from utils.db_helpers import ensure_user, take_item
+from utils.wallet import credit
 from utils.parser import parse_amount, AmountParseError
 
 
@@ -208,11 +210,10 @@ class TradeQuests(commands.GroupCog, name="trade-quest"):
 
     async def process_trade_quest(self, user_id: int, quest_id: int) -> Any:
         await ensure_user(self.bot.db, user_id)
-        await ensure_inventory(self.bot.db, user_id)
 
         try:
             async with self.bot.db.acquire() as conn:
-                async with conn.transaction():
+                async with transaction(conn):
                     quest = await conn.fetchrow("""
                         SELECT * FROM trade_quests
                         WHERE id = $1 AND expires_at > NOW()
@@ -233,10 +234,7 @@ class TradeQuests(commands.GroupCog, name="trade-quest"):
                     scam_chance = (10 - quest['trust_level']) / 10.0
                     is_scam = random.random() < scam_chance
 
-                    await conn.execute("""
-                        UPDATE inventory SET quantity = quantity - $1
-                        WHERE id = $2 AND item_id = $3
-                    """, quest['item_amount'], user_id, quest['item_id'])
+                    await take_item(conn, user_id, quest['item_id'], quest['item_amount'])
 
                     await conn.execute("DELETE FROM trade_quests WHERE id = $1", quest_id)
 
@@ -247,7 +245,8 @@ class TradeQuests(commands.GroupCog, name="trade-quest"):
                             "payout": 0
                         }
                     else:
-                        await conn.execute("UPDATE users SET coins = coins + $1 WHERE id = $2", quest['payout'], user_id)
+                        if quest['payout'] > 0:
+                            await credit(conn, user_id, quest['payout'], reason="trade_quest")
                         return {
                             "success": True,
                             "message": f"Trade successful! The NPC paid you **{quest['payout']}** coins.",
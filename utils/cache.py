@@ -0,0 +1,119 @@
+"""
+Bounded in-memory caches with per-entry TTL.
+
+Replaces the plain dicts that used to grow for the lifetime of the process.
+Every entry expires `ttl` seconds after it was last written and the cache never
+holds more than `maxsize` entries; when full, the least recently written entry
+is evicted. Entries are kept in write order, which is also expiry order, so
+both eviction and purging expired entries pop from the front in O(1).
+"""
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+# Every cache created in the process, by name, for cleanup and metrics
+_registry = {}
+
+
+class TTLCache:
+    """Dict-like cache with a TTL, a max size and hit/miss counters"""
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 10_000):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _registry[name] = self
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return _MISSING
+        return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self.purge_expired()
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            return default
+        del self._data[key]
+        return value
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from the front; returns how many were removed"""
+        now = time.monotonic()
+        removed = 0
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+            removed += 1
+        self.expirations += removed
+        return removed
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def all_caches() -> dict:
+    return dict(_registry)
+
+
+def purge_all() -> int:
+    """Purge expired entries from every registered cache"""
+    return sum(cache.purge_expired() for cache in _registry.values())
@@ -0,0 +1,53 @@
+"""
+Sync the app-command tree only when it actually changed.
+
+`tree.sync()` is slow and heavily rate limited, and on_ready can fire many
+times per process. A stable hash of the command payloads is stored next to the
+bot and compared before syncing.
+"""
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+HASH_FILE = os.getenv("COMMAND_TREE_HASH_FILE", ".command_tree_hash")
+
+
+def tree_hash(tree) -> str:
+    """Stable hash of every global command payload (names, options, descriptions)"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda data: (data.get("type", 1), data["name"]),
+    )
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _read_hash():
+    try:
+        with open(HASH_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_hash(value):
+    with open(HASH_FILE, "w", encoding="utf-8") as f:
+        f.write(value)
+
+
+async def sync_if_changed(tree, force=False):
+    """Sync the tree if its hash differs from the stored one.
+
+    Returns the list of synced commands, or None when the sync was skipped.
+    """
+    current = tree_hash(tree)
+    if not force and current == _read_hash():
+        logger.info("Command tree unchanged (%s), skipping sync", current[:12])
+        return None
+    synced = await tree.sync()
+    _write_hash(current)
+    logger.info("Synced %s app commands (%s)", len(synced), current[:12])
+    return synced
@@ -1,15 +1,233 @@
+import asyncio
+import contextlib
+import logging
+import sys
+import time
 import asyncpg
 import os
 from dotenv import load_dotenv
 
+from utils import metrics
+from utils.slow_query import SlowQueryLog
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 db_url = os.getenv("DB_URL")
 
-db = None 
+db = None
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def pool_settings():
+    """Pool sizing read from env, with the old hard-coded values as defaults.
+
+    asyncpg opens connections lazily up to max_size and closes idle ones after
+    max_inactive_connection_lifetime, so min/max are the autoscaling bounds.
+    """
+    return {
+        "min_size": _env_int("DB_POOL_MIN_SIZE", 1),
+        "max_size": _env_int("DB_POOL_MAX_SIZE", 2),
+        "statement_cache_size": _env_int("DB_STATEMENT_CACHE_SIZE", 100),
+        "max_inactive_connection_lifetime": _env_float("DB_MAX_INACTIVE_LIFETIME", 300.0),
+        "acquire_timeout": _env_float("DB_ACQUIRE_TIMEOUT", 0) or None,
+    }
+
+
+class PoolStats:
+    """Counters and an acquire-latency histogram for a pool"""
+
+    # Upper bounds in seconds; the last bucket catches everything slower
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+    def __init__(self):
+        self.in_use = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.buckets = [0] * len(self.BUCKETS)
+
+    def observe(self, seconds: float):
+        self.acquired += 1
+        self.wait_total += seconds
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def histogram(self):
+        """Cumulative bucket counts as (upper_bound, count) pairs"""
+        total = 0
+        result = []
+        for bound, count in zip(self.BUCKETS, self.buckets):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _PoolAcquireContext:
+    def __init__(self, pool, timeout, owner):
+        self._pool = pool
+        self._timeout = timeout
+        self._owner = owner
+        self._owner_token = None
+        self._conn = None
+
+    async def _acquire(self):
+        stats = self._pool.stats
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        start = time.perf_counter()
+        try:
+            conn = await self._pool.pool.acquire(timeout=self._timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            stats.waiting -= 1
+        stats.observe(time.perf_counter() - start)
+        stats.in_use += 1
+        return conn
+
+    async def __aenter__(self):
+        self._conn = await self._acquire()
+        self._owner_token = metrics.db_owner.set(self._owner)
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        conn, self._conn = self._conn, None
+        metrics.db_owner.reset(self._owner_token)
+        await self._pool.release(conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class Pool:
+    """asyncpg pool wrapper that records in-use, waiting and acquire latency.
+
+    Exposes the same acquire()/release() interface the cogs already use and
+    forwards everything else to the underlying asyncpg pool.
+    """
+
+    def __init__(self, pool, acquire_timeout=None):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.stats = PoolStats()
+
+    def acquire(self, *, timeout=None):
+        # The calling module (usually a cog) and function are recorded so query
+        # metrics and the slow-query log can be attributed to them.
+        frame = sys._getframe(1)
+        owner = (frame.f_globals.get("__name__", "unknown"), frame.f_code.co_name)
+        return _PoolAcquireContext(self, timeout if timeout is not None else self.acquire_timeout, owner)
+
+    async def release(self, conn, *, timeout=None):
+        self.stats.in_use -= 1
+        await self.pool.release(conn, timeout=timeout)
+
+    def snapshot(self):
+        """Current pool state as a plain dict"""
+        stats = self.stats
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "in_use": stats.in_use,
+            "waiting": stats.waiting,
+            "max_waiting": stats.max_waiting,
+            "acquired": stats.acquired,
+            "timeouts": stats.timeouts,
+            "avg_wait_ms": (stats.wait_total / stats.acquired * 1000) if stats.acquired else 0.0,
+            "histogram": stats.histogram(),
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+async def create_pool(dsn=None, **kwargs):
+    """Create the shared pool using the env-configured settings"""
+    settings = pool_settings()
+    acquire_timeout = settings.pop("acquire_timeout")
+    settings.update(kwargs)
+    slow_log = SlowQueryLog.from_env()
+
+    async def init_connection(conn):
+        conn.add_query_logger(metrics.observe_query)
+        conn.add_query_logger(slow_log)
+
+    pool = await asyncpg.create_pool(dsn=dsn or db_url, init=init_connection, **settings)
+    wrapped = Pool(pool, acquire_timeout=acquire_timeout)
+    slow_log.pool = wrapped
+    return wrapped
+
+
+# Callbacks waiting for the commit of a `transaction` block, keyed by connection
+_after_commit = {}
+
+
+@contextlib.asynccontextmanager
+async def transaction(conn):
+    """
+    conn.transaction() that runs the block's after_commit callbacks once it
+    commits, and drops them if it rolls back. Nested blocks hand their
+    callbacks to the enclosing one.
+    """
+    key = id(conn)
+    outer = _after_commit.get(key)
+    callbacks = _after_commit[key] = []
+    try:
+        async with conn.transaction():
+            yield
+    except BaseException:
+        _restore(key, outer)
+        raise
+    _restore(key, outer)
+    if outer is not None:
+        outer.extend(callbacks)
+        return
+    for func, args in callbacks:
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("after_commit callback %r failed", func)
+
+
+def _restore(key, outer):
+    if outer is None:
+        _after_commit.pop(key, None)
+    else:
+        _after_commit[key] = outer
+
+
+def after_commit(conn, func, *args):
+    """
+    Run func(*args) once conn's open `transaction` block commits, or right
+    away if there is none (autocommit statements have already committed).
+    """
+    callbacks = _after_commit.get(id(conn)) if conn is not None else None
+    if callbacks is None:
+        func(*args)
+    else:
+        callbacks.append((func, args))
+
 
 async def init_db_pool():
     global db
-    db = await asyncpg.create_pool(dsn=db_url, max_size=2, min_size=1)
+    db = await create_pool()
     print("Database pool created.")
 
 async def get_total_connections():
@@ -10,50 +10,97 @@ import asyncpg
 
 from utils.economy import format_number
 from utils.datetime_helpers import utc_now, ensure_utc
+from utils.cache import TTLCache
+from utils.votes import has_voted
 
 TOPGG_BOT_LINK = os.getenv("TOPGG_INVITE")
-TOPGG_API_TOKEN = os.getenv("TOPGG_TOKEN")
-TOPGG_BOT_ID = os.getenv("BOT_ID")
 logger = logging.getLogger(__name__)
 
 CHILDREN_MAX = 5
 PARTNERS_MAX = 2
 
+# User ids whose user_config and users rows are known to exist, so repeat
+# callers skip the database.
+known_users = TTLCache("known_users", ttl=60 * 60, maxsize=200_000)
+
 async def ensure_user(db, user_id: int):
+    """Create the user_config and users rows in one statement (or none if cached)"""
+    if user_id in known_users:
+        return
     logger.debug("ensure_user: user_id=%s", user_id)
     async with db.acquire() as conn:
         try:
-            await conn.execute("""
-                INSERT INTO user_config (user_id)
-                VALUES ($1)
-                ON CONFLICT (user_id) DO NOTHING
+            status = await conn.execute("""
+                WITH cfg AS (
+                    INSERT INTO user_config (user_id)
+                    VALUES ($1)
+                    ON CONFLICT (user_id) DO NOTHING
+                )
+                INSERT INTO users (id, coins, energy, energy_max, mood, mood_max)
+                VALUES ($1, 0, 100, 100, 100, 100)
+                ON CONFLICT (id) DO NOTHING
             """, user_id)
-            row = await conn.fetchrow("SELECT id FROM users WHERE id = $1", user_id)
-            if not row:
-                await conn.execute("""
-                    INSERT INTO users (id, coins, energy, energy_max, mood, mood_max)
-                    VALUES ($1, 0, 100, 100, 100, 100)
-                """, user_id)
+            if status == "INSERT 0 1":
                 logger.info("ensure_user: created users row for %s", user_id)
         except Exception as e:
             logger.exception("ensure_user failed for %s", user_id)
             raise
-
-async def ensure_inventory(db, user_id: int):
-    logger.debug("ensure_inventory: user_id=%s", user_id)
-   
-    async with db.acquire() as conn:
-        try:
-            await conn.execute("""
-            INSERT INTO inventory (id, item_id, quantity)
-            SELECT $1, items.id, 0
-            FROM items
-            ON CONFLICT (id, item_id) DO NOTHING
-        """, user_id)
-            logger.info("ensure_inventory: ensured inventory for %s", user_id)
-        except Exception:
-            logger.exception("ensure_inventory failed for %s", user_id)
-            raise
+    known_users[user_id] = True
+
+# Inventory is sparse: a row exists only while its quantity is above zero.
+# Grants upsert (grant_items), removals delete the row once it reaches zero
+# (take_item). No per-user backfill of every item is needed.
+
+async def grant_items(conn, user_id: int, items: dict):
+    """Add {item_id: quantity} to a user's inventory in one statement"""
+    await grant_items_many(conn, [(user_id, item_id, qty) for item_id, qty in items.items()])
+
+async def grant_items_many(conn, grants):
+    """Apply any number of (user_id, item_id, quantity) grants in one statement"""
+    totals = {}
+    for user_id, item_id, qty in grants:
+        if qty > 0:
+            totals[(user_id, item_id)] = totals.get((user_id, item_id), 0) + qty
+    if not totals:
+        return
+    # ON CONFLICT cannot touch the same row twice, hence the aggregation above
+    user_ids, item_ids = zip(*totals.keys())
+    await conn.execute("""
+        INSERT INTO inventory (id, item_id, quantity)
+        SELECT * FROM UNNEST($1::bigint[], $2::int[], $3::int[])
+        ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+    """, list(user_ids), list(item_ids), list(totals.values()))
+
+async def take_item(conn, user_id: int, item_id: int, amount: int):
+    """Remove `amount` of an item, deleting the row when nothing is left"""
+    # Both branches see the same snapshot and their predicates are disjoint,
+    # so exactly one of them touches the row.
+    await conn.execute("""
+        WITH emptied AS (
+            DELETE FROM inventory
+            WHERE id = $1 AND item_id = $2 AND quantity <= $3
+        )
+        UPDATE inventory SET quantity = quantity - $3
+        WHERE id = $1 AND item_id = $2 AND quantity > $3
+    """, user_id, item_id, amount)
+
+async def compact_inventory(db, batch_size: int = 10_000) -> int:
+    """Delete leftover zero/negative rows in batches; returns rows removed"""
+    removed = 0
+    while True:
+        async with db.acquire() as conn:
+            status = await conn.execute("""
+                DELETE FROM inventory
+                WHERE ctid IN (
+                    SELECT ctid FROM inventory WHERE quantity <= 0 LIMIT $1
+                )
+            """, batch_size)
+        deleted = int(status.split()[-1])
+        removed += deleted
+        if deleted < batch_size:
+            break
+    logger.info("compact_inventory: removed %s empty rows", removed)
+    return removed
 
 async def is_item_req_valid(db, user_id: int, item_id: int, amount: int = 1):
     try:
@@ -72,10 +119,10 @@ async def add_item(db, user_id: int, item_id: int, amount: int = 1):
     logger.debug("add_item: user_id=%s item_id=%s amount=%s", user_id, item_id, amount)
     async with db.acquire() as conn:
         try:
-            await conn.execute("""
-                UPDATE inventory SET quantity = quantity + $3
-                WHERE id = $1 AND item_id = $2
-            """, user_id, item_id, amount)
+            if amount >= 0:
+                await grant_items(conn, user_id, {item_id: amount})
+            else:
+                await take_item(conn, user_id, item_id, -amount)
             logger.info("add_item: updated inventory for %s item %s by %s", user_id, item_id, amount)
         except Exception:
             logger.exception("add_item failed for user=%s item=%s", user_id, item_id)
@@ -88,15 +135,7 @@ async def ensure_guild(db, guild_id: int):
             await conn.execute("INSERT INTO guilds (id) VALUES ($1)", guild_id)
 
 async def check_has_user_upvoted(user_id):
-    try:
-        url = f"https://top.gg/api/bots/{TOPGG_BOT_ID}/check?userId={user_id}"
-        headers = {"Authorization": TOPGG_API_TOKEN}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as resp:
-                if resp.status != 200: return False
-                data = await resp.json()
-                return bool(data.get("voted", 0))
-    except: return False
+    return await has_voted(user_id)
 
 async def get_active_effects(db, user_id: int):
     async with db.acquire() as conn:
@@ -116,15 +155,37 @@ async def ensure_guild_cfg(pool, guild_id: int):
                 VALUES ($1, TRUE, FALSE)
             """, guild_id)
 
+# Spending is summed in memory per (day, hour) and written by flush_spending,
+# which runs on a short interval and at shutdown. Purchases never touch the
+# hot spending_hourly row themselves; at most one flush interval is lost on a
+# crash.
+_pending_spending = {}
+
 async def log_spending(db, amount: int):
     now = utc_now()
-    async with db.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO spending_hourly (day, hour, total_spent)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (day, hour)
-            DO UPDATE SET total_spent = spending_hourly.total_spent + EXCLUDED.total_spent
-        """, now.date(), now.hour, amount)
+    key = (now.date(), now.hour)
+    _pending_spending[key] = _pending_spending.get(key, 0) + amount
+
+async def flush_spending(db):
+    global _pending_spending
+    if not _pending_spending:
+        return
+    pending, _pending_spending = _pending_spending, {}
+    days, hours = zip(*pending.keys())
+    try:
+        async with db.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO spending_hourly (day, hour, total_spent)
+                SELECT * FROM UNNEST($1::date[], $2::int[], $3::bigint[])
+                ON CONFLICT (day, hour)
+                DO UPDATE SET total_spent = spending_hourly.total_spent + EXCLUDED.total_spent
+            """, list(days), list(hours), list(pending.values()))
+    except Exception:
+        # Put the totals back so the next flush retries them
+        for key, amount in pending.items():
+            _pending_spending[key] = _pending_spending.get(key, 0) + amount
+        logger.exception("flush_spending failed, %s buckets kept for retry", len(pending))
+        raise
 
 async def ensure_mine(db, guild_id: int):
     async with db.acquire() as conn:
@@ -159,14 +220,118 @@ async def get_parent(db, user_id: int):
     parents = await get_parents(db, user_id)
     return parents[0] if parents else None
 
+# family_closure holds one row per (ancestor, descendant, depth) with the
+# number of distinct parent paths of that length, so kinship checks are plain
+# index lookups. It is kept in sync with `parents` by add_child and
+# remove_child_relationship, in the same transaction as the parents write.
+# Both read the closure around an edge before writing it, so they first take
+# a transaction-level advisory lock on every root of the families involved;
+# edits within one family then apply one after another.
+
+_CLOSURE_DELTA = """
+    SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1 AS depth, SUM(a.paths * d.paths) AS paths
+    FROM (
+        SELECT ancestor_id, depth, paths FROM family_closure WHERE descendant_id = $1
+        UNION ALL SELECT $1, 0, 1
+    ) a
+    CROSS JOIN (
+        SELECT descendant_id, depth, paths FROM family_closure WHERE ancestor_id = $2
+        UNION ALL SELECT $2, 0, 1
+    ) d
+    GROUP BY 1, 2, 3
+"""
+
+_FAMILY_ROOTS = """
+    SELECT f.ancestor_id AS id FROM family_closure f
+    WHERE f.descendant_id = ANY($1::bigint[])
+      AND NOT EXISTS (SELECT 1 FROM parents p WHERE p.child_id = f.ancestor_id)
+    UNION
+    SELECT u.id FROM UNNEST($1::bigint[]) AS u(id)
+    WHERE NOT EXISTS (SELECT 1 FROM family_closure f WHERE f.descendant_id = u.id)
+"""
+
+async def _lock_families(conn, *user_ids: int):
+    # Locks are taken in id order; if a concurrent edit moved the roots while
+    # we waited, the new ones are locked too.
+    locked = set()
+    while True:
+        roots = {r["id"] for r in await conn.fetch(_FAMILY_ROOTS, list(user_ids))}
+        missing = sorted(roots - locked)
+        if not missing:
+            return
+        for root in missing:
+            await conn.execute("SELECT pg_advisory_xact_lock($1::bigint)", root)
+        locked.update(missing)
+
+async def _closure_link(conn, parent_id: int, child_id: int):
+    await _lock_families(conn, parent_id, child_id)
+    await conn.execute(f"""
+        INSERT INTO family_closure (ancestor_id, descendant_id, depth, paths)
+        {_CLOSURE_DELTA}
+        ON CONFLICT (ancestor_id, descendant_id, depth)
+        DO UPDATE SET paths = family_closure.paths + EXCLUDED.paths
+    """, parent_id, child_id)
+
+async def _closure_unlink(conn, parent_id: int, child_id: int):
+    # Rows whose every path went through this edge are deleted, the rest lose
+    # that many paths; the predicates are disjoint so each row is touched once.
+    await _lock_families(conn, parent_id, child_id)
+    await conn.execute(f"""
+        WITH delta AS ({_CLOSURE_DELTA}),
+        gone AS (
+            DELETE FROM family_closure f
+            USING delta
+            WHERE f.ancestor_id = delta.ancestor_id AND f.descendant_id = delta.descendant_id
+              AND f.depth = delta.depth AND f.paths <= delta.paths
+        )
+        UPDATE family_closure f SET paths = f.paths - delta.paths
+        FROM delta
+        WHERE f.ancestor_id = delta.ancestor_id AND f.descendant_id = delta.descendant_id
+          AND f.depth = delta.depth AND f.paths > delta.paths
+    """, parent_id, child_id)
+
+async def rebuild_family_closure(db):
+    """Recompute family_closure from scratch out of the parents table"""
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM family_closure")
+            status = await conn.execute("""
+                WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+                    SELECT parent_id, child_id, 1 FROM parents
+                    UNION ALL
+                    SELECT w.ancestor_id, p.child_id, w.depth + 1
+                    FROM walk w
+                    JOIN parents p ON p.parent_id = w.descendant_id
+                    WHERE w.depth < 100  -- guard against corrupt cyclic data
+                )
+                INSERT INTO family_closure (ancestor_id, descendant_id, depth, paths)
+                SELECT ancestor_id, descendant_id, depth, COUNT(*)
+                FROM walk
+                GROUP BY ancestor_id, descendant_id, depth
+            """)
+    rows = int(status.split()[-1])
+    logger.info("rebuild_family_closure: %s rows", rows)
+    return rows
+
+async def ensure_family_closure(db):
+    """Build family_closure once if it is empty but parents is not"""
+    async with db.acquire() as conn:
+        needs_build = await conn.fetchval("""
+            SELECT EXISTS(SELECT 1 FROM parents) AND NOT EXISTS(SELECT 1 FROM family_closure)
+        """)
+    if needs_build:
+        await rebuild_family_closure(db)
+
 async def add_child(db, parent_id: int, child_id: int):
     logger.debug("add_child: parent=%s child=%s", parent_id, child_id)
     async with db.acquire() as conn:
         try:
-            await conn.execute(
-                "INSERT INTO parents (child_id, parent_id) VALUES ($1, $2)",
-                child_id, parent_id
-            )
+            async with conn.transaction():
+                await conn.execute(
+                    "INSERT INTO parents (child_id, parent_id) VALUES ($1, $2)",
+                    child_id, parent_id
+                )
+                await _closure_link(conn, parent_id, child_id)
             logger.info("add_child: relationship added parent=%s -> child=%s", parent_id, child_id)
         except Exception:
             logger.exception("add_child failed parent=%s child=%s", parent_id, child_id)
@@ -176,10 +341,13 @@ async def remove_child_relationship(db, child_id: int):
     logger.debug("remove_child_relationship: child=%s", child_id)
     async with db.acquire() as conn:
         try:
-            await conn.execute(
-                "DELETE FROM parents WHERE child_id = $1",
-                child_id
-            )
+            async with conn.transaction():
+                removed = await conn.fetch(
+                    "DELETE FROM parents WHERE child_id = $1 RETURNING parent_id",
+                    child_id
+                )
+                for row in removed:
+                    await _closure_unlink(conn, row["parent_id"], child_id)
             logger.info("remove_child_relationship: removed all parents for child=%s", child_id)
         except Exception:
             logger.exception("remove_child_relationship failed for child=%s", child_id)
@@ -323,27 +491,17 @@ async def check_parent_conflicts(db, child_id: int, parent_id: int):
 
 async def can_adopt(db, parent_id: int, child_id: int):
     """
-    Check if parent_id can adopt child_id using recursive CTE.
+    Check if parent_id can adopt child_id.
     Ensures parent is not already a descendant of the child.
     """
     logger.debug("can_adopt: parent=%s child=%s", parent_id, child_id)
     async with db.acquire() as conn:
         try:
             result = await conn.fetchval("""
-                WITH RECURSIVE descendants(id) AS (
-                    -- Direct children of the child
-                    SELECT child_id
-                    FROM parents
-                    WHERE parent_id = $1
-
-                    UNION
-
-                    -- Recursive descendants of the child
-                    SELECT p.child_id
-                    FROM parents p
-                    JOIN descendants d ON p.parent_id = d.id
+                SELECT EXISTS(
+                    SELECT 1 FROM family_closure
+                    WHERE ancestor_id = $1 AND descendant_id = $2
                 )
-                SELECT EXISTS(SELECT 1 FROM descendants WHERE id = $2)
             """, child_id, parent_id)
             logger.debug("can_adopt: descendant_check result=%s", result)
             return not result  # Return True if parent is NOT a descendant
@@ -360,38 +518,12 @@ async def is_too_closely_related(db, user_a: int, user_b: int, depth: int = 3):
     async with db.acquire() as conn:
         try:
             result = await conn.fetchval("""
-                WITH RECURSIVE 
-                ancestors_a(ancestor_id, generation) AS (
-                    -- Direct parents of user_a
-                    SELECT parent_id, 1
-                    FROM parents
-                    WHERE child_id = $1
-
-                    UNION
-
-                    -- Recursive ancestors of user_a up to depth
-                    SELECT p.parent_id, a.generation + 1
-                    FROM parents p
-                    JOIN ancestors_a a ON p.child_id = a.ancestor_id
-                    WHERE a.generation < $3
-                ),
-                ancestors_b(ancestor_id, generation) AS (
-                    -- Direct parents of user_b
-                    SELECT parent_id, 1
-                    FROM parents
-                    WHERE child_id = $2
-
-                    UNION
-
-                    -- Recursive ancestors of user_b up to depth
-                    SELECT p.parent_id, b.generation + 1
-                    FROM parents p
-                    JOIN ancestors_b b ON p.child_id = b.ancestor_id
-                    WHERE b.generation < $3
-                )
                 SELECT EXISTS(
-                    SELECT 1 FROM ancestors_a a
-                    JOIN ancestors_b b ON a.ancestor_id = b.ancestor_id
+                    SELECT 1
+                    FROM family_closure a
+                    JOIN family_closure b ON b.ancestor_id = a.ancestor_id
+                    WHERE a.descendant_id = $1 AND a.depth <= $3
+                      AND b.descendant_id = $2 AND b.depth <= $3
                 )
             """, user_a, user_b, depth)
             logger.debug("is_too_closely_related: result=%s", result)
@@ -400,20 +532,84 @@ async def is_too_closely_related(db, user_a: int, user_b: int, depth: int = 3):
             logger.exception("is_too_closely_related query failed for %s vs %s", user_a, user_b)
             raise
 
+async def get_kinship(db, user_id: int, target_id: int, depth: int = 3):
+    """All blood-relationship flags between two users from one closure lookup"""
+    async with db.acquire() as conn:
+        return await conn.fetchrow("""
+            SELECT
+                EXISTS(SELECT 1 FROM family_closure
+                       WHERE ancestor_id = $1 AND descendant_id = $2 AND depth = 1) AS is_child,
+                EXISTS(SELECT 1 FROM family_closure
+                       WHERE ancestor_id = $2 AND descendant_id = $1 AND depth = 1) AS is_parent,
+                EXISTS(SELECT 1 FROM family_closure a
+                       JOIN family_closure b ON b.ancestor_id = a.ancestor_id
+                       WHERE a.descendant_id = $1 AND a.depth = 1
+                         AND b.descendant_id = $2 AND b.depth = 1) AS is_sibling,
+                EXISTS(SELECT 1 FROM family_closure a
+                       JOIN family_closure b ON b.ancestor_id = a.ancestor_id
+                       WHERE a.descendant_id = $1 AND a.depth <= $3
+                         AND b.descendant_id = $2 AND b.depth <= $3) AS is_extended,
+                EXISTS(SELECT 1 FROM family_closure
+                       WHERE ancestor_id = $2 AND descendant_id = $1) AS is_ancestor,
+                EXISTS(SELECT 1 FROM family_closure
+                       WHERE ancestor_id = $1 AND descendant_id = $2) AS is_descendant
+        """, user_id, target_id, depth)
+
 async def get_all_family_members(db, user_id: int, max_generations: int = 5):
     logger.debug("get_all_family_members: user_id=%s max_generations=%s", user_id, max_generations)
+    # One recursive query finds every user reachable within the generation
+    # bound and returns all parent/marriage edges touching them; the walk
+    # below then runs against those edges in memory.
+    async with db.acquire() as conn:
+        rows = await conn.fetch("""
+            WITH RECURSIVE edges(src, dst, delta) AS (
+                SELECT spouse_a, spouse_b, 0 FROM marriages
+                UNION ALL
+                SELECT spouse_b, spouse_a, 0 FROM marriages
+                UNION ALL
+                SELECT parent_id, child_id, 1 FROM parents
+                UNION ALL
+                SELECT child_id, parent_id, -1 FROM parents
+            ), walk(id, gen) AS (
+                SELECT $1::bigint, 0
+                UNION
+                SELECT e.dst, w.gen + e.delta
+                FROM walk w
+                JOIN edges e ON e.src = w.id
+                WHERE abs(w.gen + e.delta) <= $2
+            ), members AS (
+                SELECT DISTINCT id FROM walk
+            )
+            SELECT 'parent' AS kind, child_id AS a, parent_id AS b
+            FROM parents
+            WHERE child_id IN (SELECT id FROM members) OR parent_id IN (SELECT id FROM members)
+            UNION ALL
+            SELECT 'marriage', spouse_a, spouse_b
+            FROM marriages
+            WHERE spouse_a IN (SELECT id FROM members) OR spouse_b IN (SELECT id FROM members)
+        """, user_id, max_generations)
+
+    parents_of, children_of, partners_of = {}, {}, {}
+    for kind, a, b in rows:
+        if kind == "parent":
+            parents_of.setdefault(a, []).append(b)
+            children_of.setdefault(b, []).append(a)
+        else:
+            partners_of.setdefault(a, []).append(b)
+            partners_of.setdefault(b, []).append(a)
+
     family = {}
     visited = set()
 
-    async def walk(uid: int, gen: int):
+    def walk(uid: int, gen: int):
         if uid in visited or abs(gen) > max_generations:
             return
 
         visited.add(uid)
 
-        parents = await get_parents(db, uid)  # Support multiple parents
-        partners = await get_user_partners(db, uid)
-        children = await get_user_children(db, uid)
+        parents = parents_of.get(uid, [])  # Support multiple parents
+        partners = partners_of.get(uid, [])
+        children = children_of.get(uid, [])
 
         family[uid] = {
             "id": uid,
@@ -423,12 +619,12 @@ async def get_all_family_members(db, user_id: int, max_generations: int = 5):
         }
 
         for p in partners:
-            await walk(p, gen)
+            walk(p, gen)
         for c in children:
-            await walk(c, gen + 1)
+            walk(c, gen + 1)
         for parent in parents:  # Walk through all parents
-            await walk(parent, gen - 1)
+            walk(parent, gen - 1)
 
-    await walk(user_id, 0)
+    walk(user_id, 0)
     logger.debug("get_all_family_members: visited_count=%s", len(visited))
     return sorted(family.values(), key=lambda x: (x["generation"], x["id"]))
@@ -0,0 +1,264 @@
+"""
+Energy/mood effects (REST, REPLENISHED, EXHAUSTED, GAMBLING_ADDICT).
+
+By default the effect scheduler applies one step of every active effect to
+`users` each BASE_TICK. With LAZY_EFFECTS enabled the scheduler stops
+writing to `users`. Instead, each command that reads energy or mood calls
+`settle_user` first. That applies every whole tick elapsed since the
+effect's `settled_at`, up to the effect's duration, and writes the result
+back once. The scheduler then only settles and deletes expired effects.
+`settled_at` is NULL while eager mode owns a row; `adopt_mode` hands the
+rows over when the bot starts in the other mode.
+
+`active_effects` answers "does this user have effect X" from memory, so hot
+paths such as the per-message REST check never reach the database.
+"""
+import heapq
+import logging
+import os
+import time
+
+from utils.database import after_commit
+from utils.singleton import BASE_TICK, EffectID
+
+logger = logging.getLogger(__name__)
+
+LAZY_EFFECTS = os.getenv("LAZY_EFFECTS", "false").lower() in ("1", "true", "yes")
+
+# Per-tick stat changes: effect -> (column, step). Gains are capped at
+# <column>_max, drains at zero.
+TICK_EFFECTS = {
+    EffectID.REST: ("energy", 1),
+    EffectID.REPLENISHED: ("energy", 2),
+    EffectID.EXHAUSTED: ("energy", -1),
+    EffectID.GAMBLING_ADDICT: ("mood", -1),
+}
+
+NOW_EPOCH = "EXTRACT(EPOCH FROM clock_timestamp())"
+
+
+def active_effect(now: str = NOW_EPOCH) -> str:
+    """Condition on current_effects e (with $1 = BASE_TICK) that holds while it runs at `now`"""
+    return f"EXTRACT(EPOCH FROM e.applied_at) + (e.duration * $1) > {now}"
+
+
+def _settled(column: str) -> str:
+    # Each effect's steps are applied and clamped in turn, in TICK_EFFECTS
+    # order, the way the eager scheduler applies them
+    value = f"u.{column}"
+    for effect_id, (col, step) in TICK_EFFECTS.items():
+        if col != column:
+            continue
+        steps = f"d.steps_{effect_id}"
+        if step > 0:
+            bounded = f"LEAST({value} + {step} * {steps}, u.{column}_max)"
+        else:
+            bounded = f"GREATEST({value} - {-step} * {steps}, 0)"
+        value = f"CASE WHEN {steps} > 0 THEN {bounded} ELSE {value} END"
+    return value
+
+
+_STEPS = ", ".join(
+    f"COALESCE(SUM(steps) FILTER (WHERE effect_id = {effect_id}), 0) AS steps_{effect_id}"
+    for effect_id in TICK_EFFECTS
+)
+
+
+# $1 = BASE_TICK, $2 = effect ids, $3 = user id or NULL for everyone,
+# $4 = only expired effects, $5 = epoch to settle up to (NULL for the
+# current clock). Ticks reached so far are counted from
+# applied_at; ticks already settled from settled_at (a refresh that moves
+# applied_at forward starts the count over).
+_SETTLE_NOW = f"COALESCE($5::float8, {NOW_EPOCH})"
+
+_SETTLE = f"""
+    WITH due AS (
+        SELECT e.user_id, e.effect_id,
+               LEAST(e.duration, FLOOR(({_SETTLE_NOW} - EXTRACT(EPOCH FROM e.applied_at)) / $1))::int8 AS reached,
+               CASE WHEN e.settled_at > e.applied_at
+                    THEN FLOOR(EXTRACT(EPOCH FROM e.settled_at - e.applied_at) / $1)::int8
+                    ELSE 0 END AS settled
+        FROM current_effects e
+        WHERE e.effect_id = ANY($2::int8[])
+          AND ($3::int8 IS NULL OR e.user_id = $3)
+          AND (NOT $4 OR NOT ({active_effect(_SETTLE_NOW)}))
+        FOR UPDATE
+    ), marked AS (
+        UPDATE current_effects e
+        SET settled_at = e.applied_at + make_interval(secs => d.reached * $1)
+        FROM due d
+        WHERE e.user_id = d.user_id AND e.effect_id = d.effect_id AND d.reached > d.settled
+        RETURNING e.user_id, e.effect_id, d.reached - d.settled AS steps
+    ), deltas AS (
+        SELECT user_id, {_STEPS}
+        FROM marked
+        GROUP BY user_id
+    )
+    UPDATE users u
+    SET energy = {_settled("energy")},
+        mood = {_settled("mood")}
+    FROM deltas d
+    WHERE u.id = d.user_id
+"""
+
+
+async def settle_effects(conn, user_id=None, expired_only=False, now: float = None) -> int:
+    """
+    Apply all whole ticks not yet applied; returns the number of users updated.
+
+    `now` (an epoch from the database clock) pins the cut-off, so a later
+    statement in the same transaction can use the same instant.
+    """
+    status = await conn.execute(_SETTLE, BASE_TICK, list(TICK_EFFECTS), user_id, expired_only, now)
+    return int(status.split()[-1])
+
+
+async def settle_user(conn, user_id: int):
+    """Bring a user's energy/mood up to date before reading it (no-op unless LAZY_EFFECTS)"""
+    if LAZY_EFFECTS:
+        await settle_effects(conn, user_id)
+
+
+# $1 = effect ids; only rows without a settled_at are touched
+_STAMP_NOW = """
+    UPDATE current_effects SET settled_at = clock_timestamp()::timestamp
+    WHERE settled_at IS NULL AND effect_id = ANY($1::int8[])
+"""
+
+_STAMP_NEW = """
+    UPDATE current_effects SET settled_at = applied_at
+    WHERE settled_at IS NULL AND effect_id = ANY($1::int8[])
+"""
+
+
+async def adopt_mode(conn):
+    """
+    Hand current_effects over to the configured mode; run once at startup,
+    inside a transaction.
+
+    Eager rows have had their ticks applied up to the scheduler's last run,
+    so lazy mode starts counting them from now. Lazy rows may still owe
+    ticks, so eager mode settles them before clearing settled_at.
+    """
+    effect_ids = list(TICK_EFFECTS)
+    if LAZY_EFFECTS:
+        status = await conn.execute(_STAMP_NOW, effect_ids)
+        logger.info("Lazy effects: %s rows taken over from eager mode", status.split()[-1])
+        return
+    # Stamping the eager rows first keeps the settle from counting them again
+    await conn.execute(_STAMP_NOW, effect_ids)
+    settled = await settle_effects(conn)
+    await conn.execute(
+        "UPDATE current_effects SET settled_at = NULL WHERE settled_at IS NOT NULL AND effect_id = ANY($1::int8[])",
+        effect_ids,
+    )
+    logger.info("Eager effects: settled %s users left by lazy mode", settled)
+
+
+async def stamp_new_effects(conn) -> int:
+    """
+    Give lazy-mode rows created since the last call a settled_at, so a NULL
+    settled_at always means eager mode last owned the row.
+    """
+    status = await conn.execute(_STAMP_NEW, list(TICK_EFFECTS))
+    return int(status.split()[-1])
+
+
+# Appended to INSERT/UPDATE statements on current_effects so the caller can
+# pass the row straight to active_effects.track
+RETURNING_EXPIRY = (
+    f"RETURNING user_id, effect_id, (EXTRACT(EPOCH FROM applied_at) + duration * {BASE_TICK})::float8 AS expires_at"
+)
+
+
+class ActiveEffects:
+    """
+    In-process index of which effects each user currently has.
+
+    Each user maps to a bitset of effect ids, each (user, effect) to its
+    expiry epoch, and a min-heap of expiries drops entries as they run out.
+    Writes to current_effects update the index through track/discard, which
+    wait for the caller's `utils.database.transaction` (if any) to commit.
+    A periodic reload repairs anything missed; changes made while it runs
+    are journaled and replayed onto the reloaded index.
+    """
+
+    def __init__(self):
+        self._masks = {}
+        self._expiry = {}
+        self._heap = []
+        self._journal = None
+        self.loaded = False
+
+    def add(self, user_id: int, effect_id: int, expires_at: float):
+        if self._journal is not None:
+            self._journal.append(("add", (user_id, effect_id, expires_at)))
+        self._masks[user_id] = self._masks.get(user_id, 0) | (1 << effect_id)
+        self._expiry[(user_id, effect_id)] = expires_at
+        heapq.heappush(self._heap, (expires_at, user_id, effect_id))
+
+    def track(self, row, conn=None):
+        """Record a row returned by a statement ending in RETURNING_EXPIRY, once conn commits"""
+        if row is not None:
+            after_commit(conn, self.add, row["user_id"], row["effect_id"], row["expires_at"])
+
+    def untrack(self, user_id: int, effect_id: int, conn=None):
+        """discard() once conn commits"""
+        after_commit(conn, self.discard, user_id, effect_id)
+
+    def discard(self, user_id: int, effect_id: int):
+        if self._journal is not None:
+            self._journal.append(("discard", (user_id, effect_id)))
+        if self._expiry.pop((user_id, effect_id), None) is None:
+            return
+        mask = self._masks.get(user_id, 0) & ~(1 << effect_id)
+        if mask:
+            self._masks[user_id] = mask
+        else:
+            self._masks.pop(user_id, None)
+
+    def _expire(self, now: float):
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, user_id, effect_id = heapq.heappop(heap)
+            # Skip stale heap entries left behind by refreshes and discards
+            if self._expiry.get((user_id, effect_id)) == expires_at:
+                self.discard(user_id, effect_id)
+
+    def has(self, user_id: int, effect_id: int) -> bool:
+        self._expire(time.time())
+        return bool(self._masks.get(user_id, 0) & (1 << effect_id))
+
+    def effects(self, user_id: int) -> list:
+        self._expire(time.time())
+        mask = self._masks.get(user_id, 0)
+        return [effect_id for effect_id in range(mask.bit_length()) if mask & (1 << effect_id)]
+
+    async def load(self, db):
+        """Replace the index with the live rows of current_effects"""
+        # Changes that land while the fetch is in flight may be missing from
+        # its snapshot, so they are journaled and applied again on top of it
+        self._journal = []
+        try:
+            async with db.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT user_id, effect_id, (EXTRACT(EPOCH FROM applied_at) + duration * $1)::float8 AS expires_at
+                    FROM current_effects
+                    WHERE EXTRACT(EPOCH FROM applied_at) + duration * $1 > EXTRACT(EPOCH FROM clock_timestamp())
+                """, BASE_TICK)
+            fresh = ActiveEffects()
+            for row in rows:
+                fresh.track(row)
+            for method, args in self._journal:
+                getattr(fresh, method)(*args)
+        finally:
+            self._journal = None
+        self._masks, self._expiry, self._heap = fresh._masks, fresh._expiry, fresh._heap
+        self.loaded = True
+        logger.info("Active effects index loaded: %s effects for %s users", len(self._expiry), len(self._masks))
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+active_effects = ActiveEffects()
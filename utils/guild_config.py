@@ -0,0 +1,84 @@
+"""
+In-memory mirror of the guild_config table.
+
+Every message resolves a prefix and several commands read the same row again
+(transfer tax, allow_rob, locale), so the whole table is loaded once at startup
+and served from memory. Writes go through `set`, which updates the database and
+the cached row together.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = "."
+
+# Column defaults, mirrored from db.ddl
+DEFAULTS = {
+    "prefix": None,
+    "allow_rob": True,
+    "locale": None,
+    "transfer_tax_rate": 0.0,
+}
+
+
+class GuildConfig:
+    """Cached guild settings, keyed by guild id"""
+
+    def __init__(self, db):
+        self.db = db
+        self._rows = {}
+
+    async def load(self):
+        """Load every guild_config row into memory"""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT guild_id, prefix, allow_rob, locale, transfer_tax_rate
+                FROM guild_config
+            """)
+        self._rows = {
+            row["guild_id"]: {field: row[field] for field in DEFAULTS}
+            for row in rows
+        }
+        logger.info("GuildConfig: loaded %s guilds", len(self._rows))
+
+    def get(self, guild_id: int, field: str):
+        row = self._rows.get(guild_id)
+        value = row.get(field) if row else None
+        return DEFAULTS[field] if value is None else value
+
+    def prefix(self, guild_id: int) -> str:
+        return self.get(guild_id, "prefix") or DEFAULT_PREFIX
+
+    def allow_rob(self, guild_id: int) -> bool:
+        return bool(self.get(guild_id, "allow_rob"))
+
+    def locale(self, guild_id: int):
+        return self.get(guild_id, "locale")
+
+    def transfer_tax_rate(self, guild_id: int) -> float:
+        return float(self.get(guild_id, "transfer_tax_rate"))
+
+    async def set(self, guild_id: int, field: str, value):
+        """Persist a single setting and update the cached row"""
+        if field not in DEFAULTS:
+            raise KeyError(field)
+        async with self.db.acquire() as conn:
+            await conn.execute(f"""
+                INSERT INTO guild_config (guild_id, {field})
+                VALUES ($1, $2)
+                ON CONFLICT (guild_id) DO UPDATE SET {field} = EXCLUDED.{field}
+            """, guild_id, value)
+        self.add(guild_id)[field] = value
+
+    def add(self, guild_id: int) -> dict:
+        """Ensure a cached row exists (with column defaults) and return it"""
+        return self._rows.setdefault(guild_id, dict(DEFAULTS))
+
+    def discard(self, guild_id: int):
+        self._rows.pop(guild_id, None)
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
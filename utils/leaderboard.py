@@ -0,0 +1,267 @@
+"""
+In-memory global leaderboard.
+
+Opted-in users live in an order-statistics treap keyed by (-coins, user_id),
+so top-k, total count and rank are answered in O(log n) without touching
+the database. Balance changes are reported in process by utils.wallet and
+utils.work through `changed`, after their statement commits. Each report
+carries `changed_at`, the clock_timestamp() of the UPDATE that produced the
+balance (select it with CHANGED_AT). Updates to one users row wait on its
+row lock, so a later commit always carries a later stamp, and a report no
+newer than the last one applied for that user is dropped instead of
+overwriting a fresher balance.
+
+Opt-in changes arrive on the `coins_changed` LISTEN/NOTIFY channel, fed by
+the user_config.lb_opt_in trigger in db.ddl. That listener is best effort
+and is reconnected in the background. A periodic full rebuild repairs
+anything missed, such as writes made outside the bot.
+"""
+import logging
+import random
+import time
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "coins_changed"
+
+# Appended to a RETURNING list on users; orders the reports for one user
+CHANGED_AT = "clock_timestamp() AS changed_at"
+
+
+class _Node:
+    __slots__ = ("key", "priority", "left", "right", "size")
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = 1
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node, key):
+    """Split into (keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class RankIndex:
+    """Order-statistics set of comparable keys backed by a treap"""
+
+    def __init__(self, keys=()):
+        self._root = None
+        for key in sorted(keys):
+            self._root = _merge(self._root, _Node(key))
+
+    def __len__(self):
+        return _size(self._root)
+
+    def insert(self, key):
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        left, rest = _split(self._root, key)
+        # rest starts with key if present; drop its smallest node
+        middle, right = _split(rest, _successor(key))
+        self._root = _merge(left, right)
+        return middle is not None
+
+    def count_less(self, key) -> int:
+        node, count = self._root, 0
+        while node:
+            if node.key < key:
+                count += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def first(self, k: int) -> list:
+        out, stack, node = [], [], self._root
+        while (stack or node) and len(out) < k:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            out.append(node.key)
+            node = node.right
+        return out
+
+
+def _successor(key):
+    # Keys are (-coins, user_id); user ids are unique, so the next possible
+    # key after (c, u) is (c, u + 1)
+    return key[0], key[1] + 1
+
+
+class Leaderboard:
+    def __init__(self):
+        self._index = RankIndex()
+        self._coins = {}
+        self._changed_at = {}
+        self._opted_out = set()
+        self._pending = None
+        self._listener = None
+        self.rebuilt_at = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def update(self, user_id: int, coins: int):
+        if user_id in self._opted_out:
+            return
+        old = self._coins.get(user_id)
+        if old == coins:
+            return
+        if old is not None:
+            self._index.remove((-old, user_id))
+        self._coins[user_id] = coins
+        self._index.insert((-coins, user_id))
+
+    def changed(self, user_id: int, coins: int, changed_at):
+        """Report a committed balance; held back and replayed if a rebuild is running"""
+        if self._pending is not None:
+            self._pending.append((user_id, coins, changed_at))
+            return
+        last = self._changed_at.get(user_id)
+        if last is not None and changed_at <= last:
+            # A newer balance for this user was already applied
+            return
+        self._changed_at[user_id] = changed_at
+        self.update(user_id, coins)
+
+    def remove(self, user_id: int):
+        self._changed_at.pop(user_id, None)
+        old = self._coins.pop(user_id, None)
+        if old is not None:
+            self._index.remove((-old, user_id))
+
+    def set_opt_in(self, user_id: int, opted_in: bool, coins: int):
+        if opted_in:
+            self._opted_out.discard(user_id)
+            self.update(user_id, coins)
+        else:
+            self.remove(user_id)
+            self._opted_out.add(user_id)
+
+    def coins(self, user_id: int):
+        return self._coins.get(user_id)
+
+    def top(self, k: int = 10) -> list:
+        """[(user_id, coins)] of the k richest opted-in users"""
+        return [(user_id, -neg_coins) for neg_coins, user_id in self._index.first(k)]
+
+    def rank(self, coins: int) -> int:
+        """1 + number of opted-in users with strictly more coins (ties share a rank)"""
+        return self._index.count_less((-coins, -1)) + 1
+
+    async def rebuild(self, db):
+        """Reload the whole leaderboard; notifications received meanwhile are replayed after"""
+        started = time.perf_counter()
+        self._pending = []
+        try:
+            async with db.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT u.id, COALESCE(u.coins, 0) AS coins, c.lb_opt_in
+                    FROM users u
+                    JOIN user_config c ON u.id = c.user_id
+                """)
+            coins = {}
+            opted_out = set()
+            for row in rows:
+                if row["lb_opt_in"]:
+                    coins[row["id"]] = row["coins"]
+                else:
+                    opted_out.add(row["id"])
+            self._index = RankIndex((-c, uid) for uid, c in coins.items())
+            self._coins, self._opted_out = coins, opted_out
+            # The snapshot has no stamps; the reports held back meanwhile are
+            # replayed on top of it and dropped if out of order among themselves
+            self._changed_at = {}
+            pending = self._pending
+        finally:
+            self._pending = None
+        for payload in pending:
+            if isinstance(payload, tuple):
+                self.changed(*payload)
+            else:
+                self._apply(payload)
+        self.rebuilt_at = time.time()
+        logger.info("Leaderboard rebuilt: %s users in %.1fms", len(self), (time.perf_counter() - started) * 1000)
+
+    def _apply(self, payload: str):
+        # "<user_id>:<coins>:<opt_in>" from the lb_opt_in trigger
+        parts = payload.split(":")
+        self.set_opt_in(int(parts[0]), parts[2] == "t", int(parts[1]))
+
+    def _on_notify(self, conn, pid, channel, payload):
+        if self._pending is not None:
+            self._pending.append(payload)
+            return
+        try:
+            self._apply(payload)
+        except (ValueError, IndexError):
+            logger.warning("Ignoring malformed %s payload %r", CHANNEL, payload)
+
+    async def listen(self, dsn):
+        """
+        Open a dedicated LISTEN connection unless one is already open.
+
+        Best effort: LISTEN may be unavailable (e.g. behind a transaction-
+        pooling proxy). Failures are logged and False is returned; opt-in
+        changes then wait for the next rebuild.
+        """
+        if self._listener is not None and not self._listener.is_closed():
+            return False
+        try:
+            listener = await asyncpg.connect(dsn)
+            try:
+                await listener.add_listener(CHANNEL, self._on_notify)
+            except Exception:
+                await listener.close()
+                raise
+        except Exception as e:
+            self._listener = None
+            logger.warning("Could not listen on %s: %s", CHANNEL, e)
+            return False
+        self._listener = listener
+        logger.info("Listening on %s", CHANNEL)
+        return True
+
+    async def close(self):
+        if self._listener is not None and not self._listener.is_closed():
+            await self._listener.close()
+        self._listener = None
+
+
+global_leaderboard = Leaderboard()
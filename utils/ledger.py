@@ -0,0 +1,173 @@
+"""
+Append-only coin ledger, written behind the request path.
+
+Every balance change made through utils.wallet (and the work command) is
+recorded with `coin_ledger.record` once its transaction commits (see
+utils.database.after_commit), so rolled-back changes never reach the
+ledger. `record` is synchronous and only appends to an in-process buffer;
+it never waits, so it is safe to call while holding a pool connection. A
+single writer task bulk-writes the buffer to coin_ledger with COPY on its
+own connection, outside the pool. It writes every LEDGER_FLUSH_MS, or
+sooner once LEDGER_BATCH_SIZE entries are waiting. The buffer holds at
+most LEDGER_QUEUE_SIZE entries. While it is full (the database is down or
+too slow) `record` sheds new entries, counts them in `dropped` and logs a
+warning, so memory stays bounded and commands never stall on the ledger;
+`reconcile` shows the drift this leaves. A failed COPY reconnects, is
+retried with backoff and keeps its batch. `close` drains everything
+before shutdown.
+
+Balances that existed before the ledger are written as one 'opening' entry
+per user when the writer starts. After that, SUM(delta) per user should
+equal users.coins. `reconcile` lists the users where it does not, which
+means some change bypassed the wallet helpers (manual edits, the
+clamp_coins trigger, a crash before a flush).
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+
+import asyncpg
+
+from utils.database import db_url
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("user_id", "delta", "reason", "ref", "created_at")
+
+_OPENING = """
+    INSERT INTO coin_ledger (user_id, delta, reason, created_at)
+    SELECT u.id, COALESCE(u.coins, 0), 'opening', NOW()
+    FROM users u
+    WHERE COALESCE(u.coins, 0) <> 0
+      AND NOT EXISTS (SELECT 1 FROM coin_ledger l WHERE l.user_id = u.id)
+"""
+
+_RECONCILE = """
+    WITH totals AS (
+        SELECT user_id, SUM(delta) AS total FROM coin_ledger GROUP BY user_id
+    )
+    SELECT u.id AS user_id, COALESCE(u.coins, 0) AS coins, COALESCE(t.total, 0) AS ledger,
+           COALESCE(u.coins, 0) - COALESCE(t.total, 0) AS drift
+    FROM users u
+    LEFT JOIN totals t ON t.user_id = u.id
+    WHERE COALESCE(u.coins, 0) <> COALESCE(t.total, 0)
+    ORDER BY ABS(COALESCE(u.coins, 0) - COALESCE(t.total, 0)) DESC
+    LIMIT $1
+"""
+
+
+class CoinLedger:
+    def __init__(self, batch_size: int = None, flush_ms: int = None, queue_size: int = None):
+        self.batch_size = batch_size or int(os.getenv("LEDGER_BATCH_SIZE") or 500)
+        self.interval = (flush_ms or int(os.getenv("LEDGER_FLUSH_MS") or 250)) / 1000
+        self.limit = queue_size or int(os.getenv("LEDGER_QUEUE_SIZE") or 20_000)
+        self._buffer = deque()
+        self._wake = asyncio.Event()
+        self._conn = None
+        self._task = None
+        self._stopping = False
+        self.queued = 0
+        self.written = 0
+        self.failures = 0
+        self.dropped = 0
+        self._inflight = 0
+
+    def record(self, user_id: int, delta: int, reason: str, ref: int = None):
+        """Buffer one committed balance change; never waits, sheds the entry if the buffer is full"""
+        if not delta:
+            return
+        if len(self._buffer) >= self.limit:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(
+                    "Coin ledger buffer full at %s entries, %s entries dropped so far", self.limit, self.dropped,
+                )
+            return
+        self._buffer.append((user_id, delta, reason, ref, datetime.now(timezone.utc)))
+        self.queued += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def start(self, db):
+        """Write opening balances for users without ledger rows, then start the writer"""
+        async with db.acquire() as conn:
+            status = await conn.execute(_OPENING)
+        logger.info("Coin ledger opening balances: %s", status)
+        self._conn = await asyncpg.connect(db_url)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def flush(self, timeout: float = 10) -> bool:
+        """Wait up to `timeout` seconds for every entry recorded so far to be written; returns whether they were"""
+        target = self.queued
+        self._wake.set()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.written < target:
+            if self._task is None or self._task.done() or asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(self.interval / 5)
+        return True
+
+    async def close(self, timeout: float = 30):
+        if self._task is None:
+            return
+        # The writer drains the buffer before it stops
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            # The batch that was being written when the writer was cancelled is lost too
+            logger.error(
+                "Coin ledger writer did not drain in %ss, %s entries lost", timeout, len(self._buffer) + self._inflight,
+            )
+        self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def qsize(self) -> int:
+        return len(self._buffer)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.batch_size))]
+                self._inflight = len(batch)
+                await self._write(batch)
+                self._inflight = 0
+            if self._stopping:
+                return
+
+    async def _write(self, batch):
+        delay = 0.5
+        while True:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(db_url)
+                await self._conn.copy_records_to_table("coin_ledger", records=batch, columns=_COLUMNS)
+                self.written += len(batch)
+                return
+            except Exception:
+                self.failures += 1
+                logger.exception("Coin ledger COPY of %s entries failed, retrying in %.1fs", len(batch), delay)
+                if self._conn is not None:
+                    self._conn.terminate()
+                    self._conn = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+async def reconcile(conn, limit: int = 20):
+    """Users whose balance differs from the sum of their ledger entries, largest drift first"""
+    return await conn.fetch(_RECONCILE, limit)
+
+
+coin_ledger = CoinLedger()
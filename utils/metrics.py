@@ -0,0 +1,204 @@
+"""
+Process metrics in the Prometheus text exposition format.
+
+Kept dependency-free: counters and histograms live in plain dicts keyed by a
+label tuple and are rendered on demand by `render`, which the embedded web
+server (utils/web.py) exposes at /metrics.
+"""
+import contextvars
+import logging
+import math
+import time
+
+from utils.cache import all_caches
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, shared by every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+# (module, function) that acquired the current connection, used to attribute
+# DB time to a cog
+db_owner = contextvars.ContextVar("db_owner", default=("unknown", "unknown"))
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per label tuple"""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._series = {}
+
+    def observe(self, label_values, seconds):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(BUCKETS), 0.0, 0]
+        buckets = series[0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+                break
+        series[1] += seconds
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (buckets, total, count) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{self.name}_bucket{{{labels},le=\"{le}\"}} {cumulative}")
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _gauge(name, help_text, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+
+command_latency = Histogram(
+    "convit_command_duration_seconds", "Command latency", ("kind", "command", "status")
+)
+db_query_latency = Histogram(
+    "convit_db_query_duration_seconds", "Database query latency", ("module",)
+)
+job_latency = Histogram(
+    "convit_job_duration_seconds", "Background job run time", ("job", "status")
+)
+db_query_errors = Counter(
+    "convit_db_query_errors_total", "Database queries that raised", ("module",)
+)
+
+
+def observe_command(kind, command, status, seconds):
+    command_latency.observe((kind, command, status), seconds)
+
+
+def observe_job(job, status, seconds):
+    job_latency.observe((job, status), seconds)
+
+
+def observe_query(record):
+    """asyncpg query logger callback"""
+    module = db_owner.get()[0]
+    db_query_latency.observe((module,), record.elapsed)
+    if record.exception is not None:
+        db_query_errors.inc((module,))
+
+
+def render(bot) -> str:
+    lines = []
+    lines += command_latency.render()
+    lines += db_query_latency.render()
+    lines += db_query_errors.render()
+    lines += job_latency.render()
+
+    pool = getattr(bot, "db", None)
+    if pool is not None and hasattr(pool, "snapshot"):
+        stats = pool.snapshot()
+        for key in ("size", "idle", "in_use", "waiting", "max_size"):
+            lines += _gauge(f"convit_db_pool_{key}", f"Pool {key.replace('_', ' ')}", [("", stats[key])])
+        lines += _gauge("convit_db_pool_acquire_timeouts", "Pool acquire timeouts", [("", stats["timeouts"])])
+
+    latency = bot.latency
+    if latency is not None and not math.isinf(latency):
+        lines += _gauge("convit_gateway_latency_seconds", "Gateway heartbeat latency", [("", latency)])
+    lines += _gauge("convit_guilds", "Guilds the bot is in", [("", len(bot.guilds))])
+
+    caches = sorted(all_caches().items())
+    for key, help_text in (
+        ("size", "Cache entries"),
+        ("hits", "Cache hits"),
+        ("misses", "Cache misses"),
+        ("evictions", "Cache evictions"),
+    ):
+        lines += _gauge(
+            f"convit_cache_{key}", help_text,
+            [(_labels(("cache",), (name,)), cache.stats()[key]) for name, cache in caches],
+        )
+    return "\n".join(lines) + "\n"
+
+
+def install_command_hooks(bot):
+    """Time prefix/hybrid commands and app commands"""
+
+    @bot.listen()
+    async def on_command(ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    @bot.listen()
+    async def on_command_completion(ctx):
+        _observe_ctx(ctx, "ok")
+
+    @bot.listen()
+    async def on_command_error(ctx, error):
+        _observe_ctx(ctx, "error")
+
+    @bot.listen()
+    async def on_interaction(interaction):
+        # Local receive time; interaction.created_at would include clock skew
+        interaction.extras["metrics_started"] = time.perf_counter()
+
+    @bot.listen()
+    async def on_app_command_completion(interaction, command):
+        _observe_interaction(interaction, command, "ok")
+
+    original_on_error = bot.tree.on_error
+
+    async def on_tree_error(interaction, error):
+        _observe_interaction(interaction, interaction.command, "error")
+        await original_on_error(interaction, error)
+
+    bot.tree.on_error = on_tree_error
+
+
+def _observe_ctx(ctx, status):
+    started = getattr(ctx, "metrics_started", None)
+    if started is None or ctx.command is None:
+        return
+    kind = "hybrid" if ctx.interaction else "prefix"
+    observe_command(kind, ctx.command.qualified_name, status, time.perf_counter() - started)
+
+
+def _observe_interaction(interaction, command, status):
+    # Slash invocations of hybrid commands are already counted as "hybrid"
+    # by on_command_completion / on_command_error
+    if command is None or getattr(command, "wrapped", None) is not None:
+        return
+    started = interaction.extras.get("metrics_started")
+    if started is None:
+        return
+    observe_command("app", command.qualified_name, status, time.perf_counter() - started)
@@ -0,0 +1,106 @@
+"""
+Shared user-profile resolution.
+
+Cogs that only need a name, mention or avatar for a user ID go through
+`bot.profiles` instead of calling `bot.fetch_user` one ID at a time. A
+lookup checks the gateway cache first, then a bounded TTL cache of earlier
+REST results. Misses are fetched concurrently under a small semaphore.
+Concurrent requests for the same ID share one fetch, and unknown users are
+remembered for a short while. A 429 pauses REST lookups until its
+retry-after has passed.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import NamedTuple, Optional
+
+import discord
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class Profile(NamedTuple):
+    id: int
+    name: str
+    display_name: str
+    avatar_url: Optional[str]
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    @classmethod
+    def from_user(cls, user) -> "Profile":
+        return cls(user.id, user.name, user.display_name, user.display_avatar.url)
+
+
+class ProfileNotFound(LookupError):
+    pass
+
+
+class ProfileResolver:
+    def __init__(self, bot, ttl: int = None, maxsize: int = 50_000, concurrency: int = None):
+        self.bot = bot
+        self._profiles = TTLCache("profiles", ttl=ttl or int(os.getenv("PROFILE_CACHE_TTL") or 3600), maxsize=maxsize)
+        self._missing = TTLCache("profiles_missing", ttl=600, maxsize=maxsize)
+        self._inflight = {}
+        self._semaphore = asyncio.Semaphore(concurrency or int(os.getenv("PROFILE_FETCH_CONCURRENCY") or 4))
+        self._paused_until = 0.0
+
+    def cached(self, user_id: int) -> Optional[Profile]:
+        """Profile from the gateway or TTL cache, without any REST call"""
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return Profile.from_user(user)
+        return self._profiles.get(user_id)
+
+    async def fetch(self, user_id: int) -> Profile:
+        """Drop-in for bot.fetch_user when only profile fields are needed; raises ProfileNotFound"""
+        profile = self.cached(user_id)
+        if profile is not None:
+            return profile
+        if user_id in self._missing:
+            raise ProfileNotFound(user_id)
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        profile = await asyncio.shield(task)
+        if profile is None:
+            raise ProfileNotFound(user_id)
+        return profile
+
+    async def fetch_many(self, user_ids) -> dict:
+        """{user_id: Profile} for every ID that could be resolved"""
+        user_ids = list(dict.fromkeys(user_ids))
+        results = await asyncio.gather(*(self.fetch(user_id) for user_id in user_ids), return_exceptions=True)
+        return {
+            user_id: profile
+            for user_id, profile in zip(user_ids, results)
+            if isinstance(profile, Profile)
+        }
+
+    async def _fetch(self, user_id: int) -> Optional[Profile]:
+        async with self._semaphore:
+            if time.monotonic() < self._paused_until:
+                return None
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                self._missing[user_id] = True
+                return None
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retry_after = float(getattr(e.response, "headers", {}).get("Retry-After", 5))
+                    self._paused_until = time.monotonic() + retry_after
+                    logger.warning("Rate limited fetching users, pausing lookups for %.1fs", retry_after)
+                else:
+                    logger.warning("fetch_user(%s) failed: %s", user_id, e)
+                return None
+        profile = Profile.from_user(user)
+        self._profiles[user_id] = profile
+        return profile
@@ -0,0 +1,120 @@
+"""
+The one background scheduler shared by every cog.
+
+Cogs register named jobs on `bot.scheduler` instead of starting their own
+AsyncIOScheduler or tasks.loop. Every job runs through a supervisor wrapper
+that never lets more than one copy run at a time, records its duration and
+outcome, and swallows (and logs) exceptions so a crashing job simply runs
+again on its next tick instead of stopping for good.
+"""
+import logging
+import time
+from datetime import datetime
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class JobStats:
+    def __init__(self, name):
+        self.name = name
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = None
+        self.last_error = None
+        self.last_run = None
+
+
+class JobScheduler:
+    """Registry of named, supervised periodic jobs on a single AsyncIOScheduler"""
+
+    def __init__(self):
+        self._scheduler = AsyncIOScheduler()
+        self.jobs = {}
+
+    def start(self):
+        if not self._scheduler.running:
+            self._scheduler.start()
+
+    def shutdown(self):
+        if self._scheduler.running:
+            self._scheduler.shutdown(wait=False)
+
+    def every(self, name, func, seconds, jitter=None, run_now=False):
+        """Run `func` every `seconds` seconds"""
+        trigger = IntervalTrigger(seconds=seconds, jitter=jitter)
+        self.register(name, func, trigger, run_now=run_now)
+
+    def cron(self, name, func, jitter=None, **fields):
+        """Run `func` on a cron schedule, e.g. cron(name, func, hour=0, minute=0)"""
+        self.register(name, func, CronTrigger(jitter=jitter, **fields))
+
+    def register(self, name, func, trigger, run_now=False):
+        """Add or replace a job. Re-registering a name (cog reload) replaces it."""
+        stats = self.jobs.get(name) or JobStats(name)
+        self.jobs[name] = stats
+        kwargs = {}
+        if run_now:
+            kwargs["next_run_time"] = datetime.now(trigger.timezone)
+        self._scheduler.add_job(
+            self._supervised,
+            trigger,
+            args=(stats, func),
+            id=name,
+            name=name,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=None,
+            **kwargs,
+        )
+        logger.info("Registered job %s (%s)", name, trigger)
+
+    def unregister(self, name):
+        if self._scheduler.get_job(name):
+            self._scheduler.remove_job(name)
+        self.jobs.pop(name, None)
+
+    async def _supervised(self, stats, func):
+        # max_instances=1 already stops APScheduler from overlapping runs; this
+        # also covers manual run_job calls racing a scheduled tick.
+        if stats.running:
+            stats.skipped += 1
+            logger.warning("Job %s still running, skipping this tick", stats.name)
+            return
+        stats.running = True
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            await func()
+            stats.last_error = None
+        except Exception as e:
+            status = "error"
+            stats.failures += 1
+            stats.last_error = repr(e)
+            logger.exception("Job %s failed", stats.name)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.running = False
+            stats.runs += 1
+            stats.last_duration = elapsed
+            stats.last_run = time.time()
+            metrics.observe_job(stats.name, status, elapsed)
+
+    async def run_job(self, name):
+        """Run a registered job immediately (through the supervisor)"""
+        job = self._scheduler.get_job(name)
+        if job is None:
+            raise KeyError(name)
+        await self._supervised(*job.args)
+
+    def next_run(self, name):
+        job = self._scheduler.get_job(name)
+        return job.next_run_time if job else None
@@ -0,0 +1,84 @@
+"""
+Slow-query log for the shared pool.
+
+Installed as an asyncpg query logger on every pool connection. Statements that
+take longer than DB_SLOW_QUERY_MS are logged with a normalized fingerprint and
+the module/function that acquired the connection. With DB_SLOW_QUERY_EXPLAIN
+enabled, an `EXPLAIN (ANALYZE, BUFFERS)` plan is captured once per fingerprint
+per day, inside a transaction that is always rolled back.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+
+from utils import metrics
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![$\w])\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+class _Rollback(Exception):
+    pass
+
+
+def fingerprint(query: str) -> str:
+    """Query text with literals replaced and whitespace collapsed"""
+    normalized = _STRING.sub("?", query)
+    normalized = _NUMBER.sub("?", normalized)
+    return _SPACE.sub(" ", normalized).strip()
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, explain: bool = False):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.pool = None
+        self._explained = TTLCache("slow_query_plans", ttl=24 * 60 * 60, maxsize=1000)
+
+    @classmethod
+    def from_env(cls):
+        threshold = float(os.getenv("DB_SLOW_QUERY_MS") or 200)
+        explain = os.getenv("DB_SLOW_QUERY_EXPLAIN", "").lower() in ("1", "true", "yes")
+        return cls(threshold, explain)
+
+    def __call__(self, record):
+        """asyncpg query logger callback"""
+        if self.threshold <= 0 or record.elapsed < self.threshold:
+            return
+        module, function = metrics.db_owner.get()
+        query = fingerprint(record.query)
+        key = hashlib.sha1(query.encode()).hexdigest()[:12]
+        logger.warning(
+            "Slow query %s (%.1fms) from %s.%s: %s",
+            key, record.elapsed * 1000, module, function, query,
+        )
+        if (
+            self.explain
+            and self.pool is not None
+            and record.exception is None
+            and key not in self._explained
+            and not query.upper().startswith("EXPLAIN")
+        ):
+            self._explained[key] = True
+            asyncio.get_running_loop().create_task(self._explain(key, record.query, record.args))
+
+    async def _explain(self, key, query, args):
+        try:
+            async with self.pool.acquire() as conn:
+                try:
+                    async with conn.transaction():
+                        rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", *args)
+                        # ANALYZE really runs the statement; never keep its writes
+                        raise _Rollback
+                except _Rollback:
+                    pass
+            plan = "\n".join(row[0] for row in rows)
+            logger.warning("Plan for slow query %s:\n%s", key, plan)
+        except Exception as e:
+            logger.error(f"Could not EXPLAIN slow query {key}: {e}")
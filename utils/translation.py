@@ -107,14 +107,14 @@ async def getUserLocale(user_id, guild_id=None):
 
     if not _bot_instance:
         return "en"
-    
+
+    if guild_id:
+        guild_locale = _bot_instance.guild_config.locale(guild_id)
+        if guild_locale:
+            return guild_locale
+
     async with _bot_instance.db.acquire() as conn:
         try:
-            if guild_id:
-                guild_locale = await conn.fetchval("SELECT locale FROM guild_config WHERE guild_id = $1", guild_id)
-                if guild_locale:
-                    return guild_locale
-            
             locale = await conn.fetchval("SELECT locale FROM user_config WHERE user_id = $1", user_id)
             if locale:
                 return locale
@@ -0,0 +1,119 @@
+"""
+top.gg vote status with caching.
+
+Vote checks sit on hot paths (bet caps, farm views), so results are cached per
+user and all requests share one aiohttp session with a short timeout. When
+TOPGG_WEBHOOK_AUTH is set, the embedded web server also accepts top.gg vote
+webhooks and marks the voter immediately, so most checks never reach top.gg.
+TOPGG_API_BASE can point the client at a local stub for testing.
+Failed checks are not cached, and concurrent checks for one user share a
+single request.
+"""
+import asyncio
+import hmac
+import logging
+import os
+
+import aiohttp
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TOPGG_API_BASE = os.getenv("TOPGG_API_BASE", "https://top.gg/api")
+TOPGG_API_TOKEN = os.getenv("TOPGG_TOKEN")
+TOPGG_BOT_ID = os.getenv("BOT_ID")
+TOPGG_WEBHOOK_AUTH = os.getenv("TOPGG_WEBHOOK_AUTH")
+
+# A top.gg vote counts for 12 hours
+VOTE_DURATION = 12 * 60 * 60
+
+# Result of the last API check, positive or negative
+_vote_status = TTLCache("topgg_vote_status", ttl=int(os.getenv("TOPGG_CACHE_TTL") or 300), maxsize=100_000)
+# Votes reported by the webhook, trusted for the whole vote window
+_webhook_votes = TTLCache("topgg_webhook_votes", ttl=VOTE_DURATION, maxsize=100_000)
+
+# user_id -> in-flight check, so concurrent callers share one request
+_pending = {}
+
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3))
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def _fetch_vote(user_id: int):
+    """top.gg's answer, or None if it could not be had"""
+    url = f"{TOPGG_API_BASE}/bots/{TOPGG_BOT_ID}/check"
+    headers = {"Authorization": TOPGG_API_TOKEN or ""}
+    try:
+        async with _get_session().get(url, params={"userId": user_id}, headers=headers) as resp:
+            if resp.status != 200:
+                logger.warning(f"top.gg vote check for {user_id} returned HTTP {resp.status}")
+                return None
+            data = await resp.json()
+            return bool(data.get("voted", 0))
+    except Exception as e:
+        logger.warning(f"top.gg vote check failed for {user_id}: {e}")
+        return None
+
+
+async def _check_vote(user_id: int):
+    voted = await _fetch_vote(user_id)
+    # Only real answers are cached; an outage is retried on the next check
+    if voted is not None:
+        _vote_status[user_id] = voted
+    return voted
+
+
+async def has_voted(user_id: int) -> bool:
+    if user_id in _webhook_votes:
+        return True
+    cached = _vote_status.get(user_id)
+    if cached is not None:
+        return cached
+    task = _pending.get(user_id)
+    if task is None:
+        task = _pending[user_id] = asyncio.ensure_future(_check_vote(user_id))
+        task.add_done_callback(lambda _: _pending.pop(user_id, None))
+    # Shielded so one caller giving up does not cancel the shared check
+    return bool(await asyncio.shield(task))
+
+
+def record_vote(user_id: int):
+    _webhook_votes[user_id] = True
+    _vote_status.pop(user_id)
+
+
+def install_routes(app):
+    """Add the top.gg vote webhook to the embedded FastAPI app, if configured"""
+    if not TOPGG_WEBHOOK_AUTH:
+        return
+    from fastapi import Header, HTTPException, Request
+
+    @app.post("/topgg/vote")
+    async def topgg_vote(request: Request, authorization: str = Header(default="")):
+        if not hmac.compare_digest(authorization.encode(), TOPGG_WEBHOOK_AUTH.encode()):
+            raise HTTPException(status_code=401)
+        try:
+            payload = await request.json()
+            user_id = int(payload["user"])
+        except (ValueError, TypeError, KeyError):
+            raise HTTPException(status_code=400)
+        vote_type = payload.get("type", "upvote")
+        # Dashboard test pings should not hand out vote perks
+        if vote_type != "test":
+            record_vote(user_id)
+        logger.info("top.gg %s vote from %s", vote_type, user_id)
+        return {"ok": True}
@@ -0,0 +1,178 @@
+"""
+Atomic coin movements.
+
+Every balance change goes through one of these helpers, and each is a
+single statement. The balance check lives in the UPDATE's WHERE clause
+(`coins >= amount`), so concurrent commands cannot overspend, and callers
+no longer read the balance before writing it. debit/credit also take
+optional energy/mood changes that are written in the same statement.
+
+A failed debit returns None. Callers that want a detailed error message
+read the balance afterwards; only the failure path pays for that.
+
+Once a change commits it is recorded on utils.ledger.coin_ledger under
+`reason` (the command or source of the change) without an extra round
+trip, and the new balance is reported to the global leaderboard. Changes
+made inside a utils.database.transaction block are reported only if it
+commits.
+"""
+from utils.database import after_commit
+from utils.leaderboard import CHANGED_AT, global_leaderboard
+from utils.ledger import coin_ledger
+
+_RETURNING = f"RETURNING coins, energy, energy_max, mood, mood_max, {CHANGED_AT}"
+
+# $3 energy cost (required and subtracted), $4 mood delta (capped at
+# mood_max when positive, floored at 0 when negative)
+_VITALS = """
+    energy = CASE WHEN $3 = 0 THEN energy ELSE GREATEST(energy - $3, 0) END,
+    mood = CASE WHEN $4 = 0 THEN mood WHEN $4 > 0 THEN LEAST(mood + $4, mood_max) ELSE GREATEST(mood + $4, 0) END
+"""
+
+
+def _report(conn, user_id: int, delta: int, coins, changed_at, reason: str, ref: int = None):
+    after_commit(conn, coin_ledger.record, user_id, delta, reason, ref)
+    if coins is not None:
+        after_commit(conn, global_leaderboard.changed, user_id, coins, changed_at)
+
+
+async def bet(conn, user_id: int, stake: int, payout: int, energy: int = 0, mood: int = 0, reason: str = "bet"):
+    """
+    Take `stake` and pay `payout` in one statement, only if the user can
+    cover the stake (and `energy`); returns the updated row or None.
+
+    For games whose outcome is rolled before anything is written.
+    """
+    # A negative stake would turn the balance check around
+    if stake <= 0 or payout < 0:
+        raise ValueError(f"invalid bet: stake {stake}, payout {payout}")
+    row = await conn.fetchrow(f"""
+        UPDATE users SET coins = coins - $2 + $5, {_VITALS}
+        WHERE id = $1 AND coins >= $2 AND ($3 = 0 OR energy >= $3)
+        {_RETURNING}
+    """, user_id, stake, energy, mood, payout)
+    if row is not None:
+        _report(conn, user_id, payout - stake, row["coins"], row["changed_at"], reason)
+    return row
+
+
+async def debit(conn, user_id: int, amount: int, energy: int = 0, mood: int = 0, reason: str = "debit"):
+    """Take `amount` coins (and `energy`) only if the user has them; returns the updated row or None"""
+    if amount <= 0:
+        raise ValueError(f"invalid debit amount {amount}")
+    return await bet(conn, user_id, amount, 0, energy, mood, reason)
+
+
+async def credit(conn, user_id: int, amount: int, mood: int = 0, reason: str = "credit"):
+    """Add `amount` coins; returns the updated row or None if the user does not exist"""
+    if amount <= 0:
+        raise ValueError(f"invalid credit amount {amount}")
+    row = await conn.fetchrow(f"""
+        UPDATE users SET coins = COALESCE(coins, 0) + $2, {_VITALS}
+        WHERE id = $1
+        {_RETURNING}
+    """, user_id, amount, 0, mood)
+    if row is not None:
+        _report(conn, user_id, amount, row["coins"], row["changed_at"], reason)
+    return row
+
+
+async def transfer(
+    conn, from_id: int, to_id: int, amount: int, tax: int = 0, guild_id: int = None,
+    to_mood: int = 0, reason: str = "transfer",
+):
+    """
+    Move `amount` from one user to another in one statement.
+
+    The receiver gets amount - tax, and the tax goes to the guild's fund when
+    guild_id is given. `to_mood` raises the receiver's mood (capped at
+    mood_max) in the same statement. Returns (sender_balance,
+    receiver_balance), or None if the sender cannot cover `amount` or the
+    receiver has no users row; nothing is written in that case.
+    """
+    if from_id == to_id:
+        raise ValueError("transfer to self")
+    if amount <= 0 or not 0 <= tax <= amount:
+        raise ValueError(f"invalid transfer: amount {amount}, tax {tax}")
+    row = await conn.fetchrow(f"""
+        WITH src AS (
+            UPDATE users SET coins = coins - $3
+            WHERE id = $1 AND coins >= $3
+              AND EXISTS (SELECT 1 FROM users WHERE id = $2)
+            RETURNING coins, {CHANGED_AT}
+        ), dst AS (
+            UPDATE users SET coins = COALESCE(coins, 0) + $3 - $4,
+                             mood = CASE WHEN $6 = 0 THEN mood ELSE LEAST(mood + $6, mood_max) END
+            WHERE id = $2 AND EXISTS (SELECT 1 FROM src)
+            RETURNING coins, {CHANGED_AT}
+        ), fund AS (
+            INSERT INTO guilds (id, coins)
+            SELECT $5::bigint, $4 WHERE $5::bigint IS NOT NULL AND $4 > 0 AND EXISTS (SELECT 1 FROM src)
+            ON CONFLICT (id) DO UPDATE SET coins = guilds.coins + EXCLUDED.coins
+        )
+        SELECT src.coins AS from_coins, src.changed_at AS from_changed_at,
+               dst.coins AS to_coins, dst.changed_at AS to_changed_at
+        FROM (SELECT 1) AS one
+        LEFT JOIN src ON true
+        LEFT JOIN dst ON true
+    """, from_id, to_id, amount, tax, guild_id, to_mood)
+    if row["from_coins"] is None:
+        return None
+    _report(conn, from_id, -amount, row["from_coins"], row["from_changed_at"], reason, to_id)
+    _report(conn, to_id, amount - tax, row["to_coins"], row["to_changed_at"], reason, from_id)
+    return row["from_coins"], row["to_coins"]
+
+
+async def fund_debit(conn, guild_id: int, user_id: int, amount: int, reason: str = "fund_give"):
+    """
+    Pay `amount` from a guild fund to a user if the fund covers it and the
+    user has a users row; returns the new fund balance or None
+    """
+    if amount <= 0:
+        raise ValueError(f"invalid fund amount {amount}")
+    row = await conn.fetchrow(f"""
+        WITH fund AS (
+            UPDATE guilds SET coins = coins - $3
+            WHERE id = $1 AND coins >= $3
+              AND EXISTS (SELECT 1 FROM users WHERE id = $2)
+            RETURNING coins
+        ), dst AS (
+            UPDATE users SET coins = COALESCE(coins, 0) + $3
+            WHERE id = $2 AND EXISTS (SELECT 1 FROM fund)
+            RETURNING coins, {CHANGED_AT}
+        )
+        SELECT fund.coins AS fund_coins, dst.coins AS user_coins, dst.changed_at
+        FROM (SELECT 1) AS one
+        LEFT JOIN fund ON true
+        LEFT JOIN dst ON true
+    """, guild_id, user_id, amount)
+    if row["fund_coins"] is None:
+        return None
+    _report(conn, user_id, amount, row["user_coins"], row["changed_at"], reason, guild_id)
+    return row["fund_coins"]
+
+
+async def fund_credit(conn, guild_id: int, user_id: int, amount: int, reason: str = "fund_donate"):
+    """Move `amount` from a user to a guild fund if the user covers it; returns the user's new balance or None"""
+    if amount <= 0:
+        raise ValueError(f"invalid fund amount {amount}")
+    row = await conn.fetchrow(f"""
+        WITH src AS (
+            UPDATE users SET coins = coins - $3
+            WHERE id = $2 AND coins >= $3
+            RETURNING coins, {CHANGED_AT}
+        ), fund AS (
+            INSERT INTO guilds (id, coins)
+            SELECT $1, $3 WHERE EXISTS (SELECT 1 FROM src)
+            ON CONFLICT (id) DO UPDATE SET coins = guilds.coins + EXCLUDED.coins
+        )
+        SELECT coins, changed_at FROM src
+    """, guild_id, user_id, amount)
+    if row is None:
+        return None
+    _report(conn, user_id, -amount, row["coins"], row["changed_at"], reason, guild_id)
+    return row["coins"]
+
+
+async def balance(conn, user_id: int):
+    return await conn.fetchval("SELECT coins FROM users WHERE id = $1", user_id)
@@ -0,0 +1,39 @@
+"""
+Embedded HTTP server, run by uvicorn inside the bot's event loop.
+
+Serves /metrics and, when configured, the top.gg vote webhook. Disabled unless
+WEB_PORT is set.
+"""
+import logging
+import os
+
+from utils import metrics, votes
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(bot):
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics():
+        return PlainTextResponse(metrics.render(bot), media_type="text/plain; version=0.0.4")
+
+    votes.install_routes(app)
+    return app
+
+
+async def serve(bot):
+    """Serve the app on WEB_HOST:WEB_PORT until cancelled; no-op if unset"""
+    port = os.getenv("WEB_PORT")
+    if not port:
+        return
+    import uvicorn
+
+    host = os.getenv("WEB_HOST", "127.0.0.1")
+    config = uvicorn.Config(create_app(bot), host=host, port=int(port), log_level="warning")
+    logger.info("Serving web endpoints on %s:%s", host, port)
+    await uvicorn.Server(config).serve()
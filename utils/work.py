@@ -0,0 +1,86 @@
+"""
+Database side of the work command: one read and one write per invocation.
+
+`load_work_state` returns the user's vitals and toolbelt count in a single
+query (effect checks come from utils.effects.active_effects). The command
+rolls its RNG in Python and passes every resulting change to `apply_work`,
+which writes users, inventory and current_effects in one statement.
+benchmarks/work_round_trips.py compares this with the old statement
+sequence.
+"""
+from utils.effects import RETURNING_EXPIRY
+from utils.database import after_commit
+from utils.leaderboard import CHANGED_AT, global_leaderboard
+from utils.ledger import coin_ledger
+from utils.singleton import ItemID
+
+_LOAD_STATE = """
+    SELECT u.coins, u.energy, u.energy_max, u.mood, u.mood_max,
+           COALESCE((
+               SELECT quantity FROM inventory
+               WHERE id = $1 AND item_id = $2 AND quantity > 0
+           ), 0) AS toolbelt
+    FROM users u
+    WHERE u.id = $1
+    LIMIT 1
+"""
+
+# $1 user, $2 coins, $3 energy cost, $4 mood cost,
+# $5/$6 item ids/quantities, $7/$8 effect ids/durations.
+# The energy check lives in the UPDATE, like utils.wallet.bet, so parallel
+# calls cannot both spend the same energy; nothing else is written if it fails.
+_APPLY = f"""
+    WITH vitals AS (
+        UPDATE users
+        SET coins = COALESCE(coins, 0) + $2, energy = energy - $3, mood = GREATEST(mood - $4, 0)
+        WHERE id = $1 AND energy >= $3
+        RETURNING coins, {CHANGED_AT}
+    ), drops AS (
+        INSERT INTO inventory (id, item_id, quantity)
+        SELECT $1, item_id, quantity FROM UNNEST($5::int[], $6::int[]) AS t(item_id, quantity)
+        WHERE EXISTS (SELECT 1 FROM vitals)
+        ON CONFLICT (id, item_id) DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+    ), effects AS (
+        INSERT INTO current_effects (user_id, effect_id, duration, ticks, applied_at)
+        SELECT $1, effect_id, duration, duration, NOW() FROM UNNEST($7::int8[], $8::int8[]) AS t(effect_id, duration)
+        WHERE EXISTS (SELECT 1 FROM vitals)
+        ON CONFLICT (user_id, effect_id) DO UPDATE
+        SET duration = EXCLUDED.duration, ticks = EXCLUDED.ticks, applied_at = NOW()
+        {RETURNING_EXPIRY}
+    )
+    SELECT v.coins, v.changed_at, e.user_id, e.effect_id, e.expires_at
+    FROM (SELECT 1) AS one
+    LEFT JOIN vitals v ON true
+    LEFT JOIN effects e ON true
+"""
+
+
+async def load_work_state(conn, user_id: int):
+    return await conn.fetchrow(_LOAD_STATE, user_id, ItemID.TOOLBELT)
+
+
+async def apply_work(conn, user_id: int, coins: int, energy: int, mood: int, drops: dict = None, effects: dict = None):
+    """
+    Apply a work result in one round trip.
+
+    drops is {item_id: quantity} and effects is {effect_id: duration}.
+    Refreshing an effect restarts its tick count, so in lazy mode the
+    caller must settle_user first (the work command does this before
+    load_work_state).
+    Once the caller's transaction commits, the coin change is recorded on
+    the ledger and the new balance reported to the leaderboard. Returns
+    the effect rows for active_effects.track, or None (and writes nothing)
+    if the user no longer has `energy`.
+    """
+    drops = {item_id: qty for item_id, qty in (drops or {}).items() if qty > 0}
+    effects = effects or {}
+    rows = await conn.fetch(
+        _APPLY, user_id, coins, energy, mood,
+        list(drops), list(drops.values()), list(effects), list(effects.values()),
+    )
+    if rows[0]["coins"] is None:
+        return None
+    after_commit(conn, coin_ledger.record, user_id, coins, "work")
+    if coins:
+        after_commit(conn, global_leaderboard.changed, user_id, rows[0]["coins"], rows[0]["changed_at"])
+    return [row for row in rows if row["effect_id"] is not None]